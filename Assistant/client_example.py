@@ -4,13 +4,35 @@ Zawiera zarówno klienta do serwera FastAPI jak i bezpośrednie użycie Ollama.
 """
 
 import requests
-import ollama
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import List, Optional, Dict, Any
 
 
 class LLMClient:
     def __init__(self, base_url: str = "http://localhost:8000"):
         self.base_url = base_url
+        # Jedna sesja z pulą połączeń - kolejne zapytania używają tego samego gniazda (keep-alive)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=20,
+            max_retries=Retry(
+                total=3, backoff_factor=0.2, status_forcelist=[502, 503, 504]
+            ),
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        """Zamyka sesję HTTP i zwalnia połączenia z puli."""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def chat(
         self,
@@ -33,13 +55,13 @@ class LLMClient:
         if functions:
             payload["functions"] = functions
 
-        response = requests.post(f"{self.base_url}/chat", json=payload)
+        response = self.session.post(f"{self.base_url}/chat", json=payload)
         response.raise_for_status()
         return response.json()
 
     def list_models(self) -> List[str]:
         """Zwraca listę dostępnych modeli."""
-        response = requests.get(f"{self.base_url}/models")
+        response = self.session.get(f"{self.base_url}/models")
         response.raise_for_status()
         return response.json()["models"]
 
@@ -80,6 +102,9 @@ if __name__ == "__main__":
     print("=" * 60)
 
     try:
+        # Import dopiero tutaj - używanie LLMClient jako biblioteki nie wymaga ollama
+        import ollama
+
         direct_response = ollama.chat(
             model="llama3.1:8b",
             messages=[{"role": "user", "content": "Cześć! Powiedz mi coś o Łodzi."}],
@@ -0,0 +1,27 @@
+"""
+Konfiguracja gunicorn dla serwerów FastAPI (produkcja, tylko Linux/macOS).
+Uruchomienie (z katalogu Assistant/):
+    gunicorn -c gunicorn_conf.py integrated_server:app
+Na Windows gunicorn nie działa - użyj: python integrated_server.py
+"""
+
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+# Więcej workerów niż OLLAMA_NUM_PARALLEL nic nie da - każdy i tak potrzebuje co najmniej jednego slotu
+workers = int(os.getenv(
+    "WEB_CONCURRENCY",
+    str(min(os.cpu_count() or 2, int(os.getenv("OLLAMA_NUM_PARALLEL", "4")))),
+))
+# Workery czytają tę zmienną, żeby policzyć swoją część OLLAMA_NUM_PARALLEL (llm_server.py)
+os.environ["WEB_CONCURRENCY"] = str(workers)
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Odpowiedzi LLM potrafią trwać długo
+timeout = 300
+graceful_timeout = 30
+keepalive = 5
+
+# Recykling workerów co ~1000 zapytań (ogranicza narastanie zużycia pamięci)
+max_requests = 1000
+max_requests_jitter = 100
@@ -3,38 +3,77 @@ Zintegrowany serwer LLM z automatycznym pobieraniem informacji o komunikacji.
 Używa OpenAI API (GPT-5.1).
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import FileResponse, ORJSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
-from openai import OpenAI
+from pydantic import BaseModel, ConfigDict, field_validator
+from typing import List, Optional, Dict, Any, Tuple, Literal
+from openai import AsyncOpenAI
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
 import os
 import re
+import orjson
+import asyncio
+import heapq
+import math
 from dotenv import load_dotenv
 from traffic_scraper import TrafficInfoScraper
 from pathlib import Path
-from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 
 # Załaduj zmienne środowiskowe
 load_dotenv()
 
-app = FastAPI(title="OpenAI Assistant with Traffic Info", version="2.0.0")
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:5173", "http://127.0.0.1:5173"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
 
-# Konfiguracja CORS
+# Opcjonalnie endpointy lokalnego LLM (llm_server.py) w tym samym procesie, pod podanym prefiksem
+# (np. "/ollama") - zamiast uruchamiać drugi serwer
+OLLAMA_ROUTES_PREFIX = os.getenv("OLLAMA_ROUTES_PREFIX", "")
+if OLLAMA_ROUTES_PREFIX:
+    import llm_server
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Serwer przyjmuje połączenia od razu - scraping działa w tle, poza ścieżką zapytań."""
+    global _refresh_event
+    _refresh_event = asyncio.Event()
+    get_traffic_bundle()
+    refresher = asyncio.create_task(_traffic_refresher())
+    if OLLAMA_ROUTES_PREFIX:
+        await llm_server.start_ollama_backend()
+    yield
+    refresher.cancel()
+    if OLLAMA_ROUTES_PREFIX:
+        await llm_server.stop_ollama_backend()
+
+
+app = FastAPI(
+    title="OpenAI Assistant with Traffic Info",
+    version="2.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
+if OLLAMA_ROUTES_PREFIX:
+    app.include_router(llm_server.router, prefix=OLLAMA_ROUTES_PREFIX)
+
+# Konfiguracja CORS - dozwolone originy z env (lista po przecinku), domyślnie frontend Vite
+CORS_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv(
+        "CORS_ORIGINS", "http://localhost:5173,http://127.0.0.1:5173"
+    ).split(",")
+    if origin.strip()
+]
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # W produkcji użyj konkretnych domen
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "OPTIONS"],
+    allow_headers=["Content-Type", "Authorization", "If-None-Match"],
+    expose_headers=["ETag"],
+    max_age=86400,
 )
 
 # Konfiguracja OpenAI
@@ -45,21 +84,130 @@ if not OPENAI_API_KEY:
 OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
 DEFAULT_MODEL = os.getenv("OPENAI_MODEL", "gpt-5.1")
 
-# Inicjalizuj klienta OpenAI
-client = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_API_BASE)
+# Inicjalizuj asynchronicznego klienta OpenAI (nie blokuje pętli zdarzeń uvicorn)
+client = AsyncOpenAI(
+    api_key=OPENAI_API_KEY,
+    base_url=OPENAI_API_BASE,
+    # HTTP/2: równoległe zapytania współdzielą jedno połączenie TLS do API
+    http_client=httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(
+            max_keepalive_connections=64, max_connections=128, keepalive_expiry=300
+        ),
+        timeout=httpx.Timeout(connect=5, read=60, write=30, pool=5),
+    ),
+)
+
+# Współdzielona sesja HTTP dla scrapera - keep-alive i pula połączeń do stron MPK / lodz.pl
+SHARED_HTTP = requests.Session()
+_shared_adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32)
+SHARED_HTTP.mount("http://", _shared_adapter)
+SHARED_HTTP.mount("https://", _shared_adapter)
 
 # Scraper
-scraper = TrafficInfoScraper()
+scraper = TrafficInfoScraper(session=SHARED_HTTP)
 # Ścieżka do pliku w katalogu głównym projektu (jeden poziom wyżej od Assistant/)
 TRAFFIC_INFO_FILE = Path(__file__).parent.parent / "traffic_info.txt"
 
+# Co ile sekund odświeżać traffic_info.txt w tle
+TRAFFIC_REFRESH_INTERVAL = int(os.getenv("TRAFFIC_REFRESH_INTERVAL", "900"))
+
+# Zdarzenie "odśwież teraz" (POST /update-traffic-info) i podsumowanie ostatniej aktualizacji
+_refresh_event: Optional[asyncio.Event] = None
+_last_update: Dict[str, Any] = {}
+
+# Linie "Źródło: https://..." w traffic_info.txt
+_SRC_RE = re.compile(r"Źródło:\s*(https?://[^\s\n]+)")
+
+# Pojedynczy wpis w traffic_info.txt - każdy kończy się linią "Źródło: ..."
+_ENTRY_RE = re.compile(r"\S.*?Źródło:[^\n]*", re.DOTALL)
+_WORD_RE = re.compile(r"\w+")
+
+# Ile najbardziej pasujących do pytania wpisów wkleić do promptu (0 = cały plik, domyślnie)
+TRAFFIC_CONTEXT_TOP_K = int(os.getenv("TRAFFIC_CONTEXT_TOP_K", "0"))
+
+# Ślady źródeł w odpowiedzi modelu (link lub słowo "źródło") - jedno przejście po tekście
+_SRC_PRESENCE_RE = re.compile(r"http|[Źź]ródło")
+
+# Sparsowana zawartość traffic_info.txt - odświeżana tylko gdy zmieni się mtime pliku
+_TRAFFIC_CACHE = {
+    "mtime": None,
+    "content": None,
+    "sources": None,
+    "system_prompt": None,
+    "entries": None,
+    "idf": None,
+}
+
+# Słowa kluczowe świadczące o tym, że odpowiedź dotyczy komunikacji
+_COMM_KEYWORDS = (
+    "linia",
+    "tramwaj",
+    "autobus",
+    "ul.",
+    "ulica",
+    "przystanek",
+    "utrudnienie",
+    "zmiana",
+)
+
+# Stała część system promptu (zasady) - wysyłana jako osobna, pierwsza wiadomość, więc jej bajty
+# są identyczne w każdym zapytaniu i API może ponownie użyć cache prefiksu promptu
+SYSTEM_PROMPT_PREFIX = """Jesteś pomocnym asystentem informacyjnym dla mieszkańców Łodzi. Odpowiadasz TYLKO na pytania o Łodzi.
+
+WAŻNE ZASADY:
+1. Odpowiadaj TYLKO w języku naturalnym (polskim), NIE generuj kodu ani JSON
+2. Odpowiadaj krótko, konkretnie i na temat
+3. Używaj TYLKO informacji z poniższego kontekstu
+4. Jeśli pytanie NIE jest związane z Łodzią, komunikacją miejską, tramwajami, autobusami, ulicami w Łodzi - powiedz: "Przepraszam, ale moim zadaniem jest odpowiadanie tylko na pytania dotyczące Łodzi. Nie mogę pomóc w innych tematach."
+5. Jeśli linia/ulica jest wymieniona w kontekście (np. "Linie: 2, 3, 6"), oznacza to że ma utrudnienia lub zmiany
+6. Jeśli linia/ulica NIE jest wymieniona w kontekście, oznacza to że działa normalnie
+7. Podawaj źródła (linki) TYLKO gdy używasz konkretnych faktów z kontekstu - dodaj je bezpośrednio przy danym fakcie w formacie: "([źródło: link])" lub na końcu sekcji z faktami
+8. NIE dodawaj źródeł jeśli nie używasz żadnych konkretnych informacji z kontekstu
+9. NIGDY nie zwracaj JSON - tylko tekstową odpowiedź"""
+
+# Wariant zasad dla kontekstu okrojonego do wpisów pasujących do pytania (TRAFFIC_CONTEXT_TOP_K) -
+# brak linii/ulicy w kontekście nie znaczy wtedy, że działa normalnie. Też stały, więc cache
+# prefiksu działa tak samo
+SYSTEM_PROMPT_PREFIX_PARTIAL = SYSTEM_PROMPT_PREFIX.replace(
+    "6. Jeśli linia/ulica NIE jest wymieniona w kontekście, oznacza to że działa normalnie",
+    "6. Kontekst zawiera tylko wybrane informacje pasujące do pytania - jeśli linia/ulica NIE jest w nim wymieniona, "
+    "NIE twierdź, że działa normalnie; powiedz, że nie masz o niej informacji",
+)
+
+# Zmienna część system promptu (kontekst) - pełna wersja renderowana raz przy każdej zmianie traffic_info.txt
+SYSTEM_PROMPT_TEMPLATE = """DOSTĘPNE ŹRÓDŁA (używaj ich gdy podajesz konkretne fakty):
+{sources_block}
+
+AKTUALNE INFORMACJE O KOMUNIKACJI W ŁODZI:
+{traffic_info}"""
+
+# Końcowe polecenie - osobna, stała wiadomość tuż przed rozmową, zamiast doklejania do kontekstu
+SYSTEM_PROMPT_DIRECTIVE = """TERAZ: Odpowiedz na pytanie użytkownika. Jeśli pytanie nie dotyczy komunikacji w Łodzi, grzecznie odmów. Jeśli używasz konkretnych faktów z powyższych informacji, podaj źródło przy danym fakcie. Odpowiadaj w języku naturalnym, NIE generuj kodu ani JSON!"""
+
+
+# Modele zapytań: nadmiarowe pola są pomijane, a zwalidowane dane są niemutowalne
+REQUEST_MODEL_CONFIG = ConfigDict(extra="ignore", frozen=True)
+
+_ROLES = frozenset(("user", "assistant", "system"))
+
 
 class Message(BaseModel):
-    role: str
+    model_config = REQUEST_MODEL_CONFIG
+
+    role: Literal["user", "assistant", "system"] = "user"
     content: str
 
+    @field_validator("role", mode="before")
+    @classmethod
+    def coerce_role(cls, value: Any) -> str:
+        # Nieznane role (także nie-napisy, np. [] z JSON) traktujemy jak wiadomości użytkownika
+        return value if isinstance(value, str) and value in _ROLES else "user"
+
 
 class ChatRequest(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
     messages: List[Message]
     model: Optional[str] = DEFAULT_MODEL
     temperature: Optional[float] = 0.7
@@ -73,47 +221,177 @@ class ChatResponse(BaseModel):
 def load_traffic_info() -> str:
     """Ładuje informacje o komunikacji z pliku."""
     try:
-        if TRAFFIC_INFO_FILE.exists():
-            content = TRAFFIC_INFO_FILE.read_text(encoding="utf-8")
-            if content.strip():
-                return content
-            return "Plik traffic_info.txt istnieje, ale jest pusty. Uruchom aktualizację: POST /update-traffic-info"
+        content = TRAFFIC_INFO_FILE.read_text(encoding="utf-8")
+    except FileNotFoundError:
         return "Brak aktualnych informacji o komunikacji. Plik traffic_info.txt nie istnieje. Uruchom aktualizację: POST /update-traffic-info"
     except Exception as e:
         return f"Błąd przy ładowaniu informacji o komunikacji: {str(e)}"
+    if content.strip():
+        return content
+    return "Plik traffic_info.txt istnieje, ale jest pusty. Uruchom aktualizację: POST /update-traffic-info"
 
 
 def extract_sources(traffic_info: str) -> List[str]:
     """Wyciąga wszystkie źródła (linki) z traffic_info.txt."""
-    sources = []
-    # Szukaj linii z "Źródło: https://"
-    pattern = r"Źródło:\s*(https?://[^\s\n]+)"
-    matches = re.findall(pattern, traffic_info)
-    sources.extend(matches)
-    # Usuń duplikaty zachowując kolejność
-    seen = set()
-    unique_sources = []
-    for source in sources:
-        if source not in seen:
-            seen.add(source)
-            unique_sources.append(source)
-    return unique_sources
+    # Szukaj linii z "Źródło: https://" i usuń duplikaty zachowując kolejność
+    return list(dict.fromkeys(_SRC_RE.findall(traffic_info)))
+
+
+def _tokenize(text: str) -> set:
+    """Zbiór słów (małymi literami) - krótkie słowa pomijamy, ale zostawiamy numery linii."""
+    return {w for w in _WORD_RE.findall(text.lower()) if len(w) > 2 or w.isdigit()}
+
+
+def split_traffic_entries(traffic_info: str) -> List[Dict[str, Any]]:
+    """Dzieli traffic_info.txt na wpisy (komunikat / utrudnienie / remont) ze zbiorem słów i źródłem."""
+    entries = []
+    for match in _ENTRY_RE.finditer(traffic_info):
+        text = match.group(0)
+        source = _SRC_RE.search(text)
+        entries.append(
+            {
+                "text": text,
+                "tokens": _tokenize(text),
+                "source": source.group(1) if source else None,
+            }
+        )
+    return entries
+
+
+def get_traffic_bundle() -> Tuple[str, List[str]]:
+    """Zwraca (treść, źródła) z traffic_info.txt; plik jest czytany ponownie tylko po zmianie mtime."""
+    try:
+        mtime = TRAFFIC_INFO_FILE.stat().st_mtime_ns
+    except OSError:
+        mtime = None
+
+    if mtime is None or mtime != _TRAFFIC_CACHE["mtime"]:
+        content = load_traffic_info()
+        sources = extract_sources(content)
+        system_prompt = SYSTEM_PROMPT_TEMPLATE.format(
+            sources_block="\n".join(f"- {source}" for source in sources[:20]),
+            traffic_info=content,
+        )
+        entries = split_traffic_entries(content)
+        # Waga słowa jak w IDF - rzadkie słowa (np. nazwa ulicy) liczą się bardziej niż częste
+        document_frequency: Dict[str, int] = {}
+        for entry in entries:
+            for token in entry["tokens"]:
+                document_frequency[token] = document_frequency.get(token, 0) + 1
+        idf = {
+            token: math.log(1 + len(entries) / count)
+            for token, count in document_frequency.items()
+        }
+        _TRAFFIC_CACHE.update(
+            mtime=mtime,
+            content=content,
+            sources=sources,
+            system_prompt=system_prompt,
+            entries=entries,
+            idf=idf,
+        )
+    return _TRAFFIC_CACHE["content"], _TRAFFIC_CACHE["sources"]
+
+
+def get_relevant_system_prompt(query: str) -> Tuple[str, List[str], bool]:
+    """
+    Zwraca system prompt zawierający tylko TRAFFIC_CONTEXT_TOP_K wpisów najlepiej
+    pasujących do pytania (mniej tokenów wejściowych), źródła tych wpisów oraz to,
+    czy kontekst jest okrojony. Gdy żaden wpis nie pasuje, zwraca pełny kontekst.
+    """
+    _, sources = get_traffic_bundle()
+    entries = _TRAFFIC_CACHE["entries"]
+    if TRAFFIC_CONTEXT_TOP_K <= 0 or len(entries) <= TRAFFIC_CONTEXT_TOP_K:
+        return _TRAFFIC_CACHE["system_prompt"], sources, False
+
+    idf = _TRAFFIC_CACHE["idf"]
+    query_tokens = _tokenize(query) & idf.keys()
+    scored = (
+        (sum(idf[token] for token in query_tokens & entry["tokens"]), index)
+        for index, entry in enumerate(entries)
+    )
+    best = heapq.nlargest(TRAFFIC_CONTEXT_TOP_K, scored)
+    # Zachowujemy kolejność z pliku
+    indices = sorted(index for score, index in best if score > 0)
+    if not indices:
+        return _TRAFFIC_CACHE["system_prompt"], sources, False
+    chosen = [entries[index] for index in indices]
+
+    selected_sources = list(
+        dict.fromkeys(entry["source"] for entry in chosen if entry["source"])
+    )
+    system_prompt = SYSTEM_PROMPT_TEMPLATE.format(
+        sources_block="\n".join(f"- {source}" for source in selected_sources),
+        traffic_info="\n\n".join(entry["text"] for entry in chosen),
+    )
+    return system_prompt, selected_sources, True
 
 
 def update_traffic_info() -> Dict:
     """Aktualizuje informacje o komunikacji."""
     data = scraper.scrape_all()
     scraper.save_consolidated(data, str(TRAFFIC_INFO_FILE))
+    # Unieważnij cache jawnie (przy zgrubnym mtime systemu plików nowy zapis może mieć ten sam
+    # znacznik czasu) i od razu wczytaj nowy plik, żeby pierwsze zapytanie go nie czytało
+    _TRAFFIC_CACHE["mtime"] = None
+    get_traffic_bundle()
     return data
 
 
+def build_messages(request: ChatRequest) -> Tuple[List[Dict[str, str]], List[str]]:
+    """Buduje listę wiadomości dla OpenAI (z kontekstem o komunikacji) i zwraca ją razem ze źródłami."""
+    # Przygotuj wiadomości (role są już zwalidowane przez model Message)
+    messages = [msg.model_dump() for msg in request.messages]
+
+    # Dodaj kontekst o komunikacji jeśli włączone
+    sources = []
+    if request.include_traffic_info:
+        query = next(
+            (m["content"] for m in reversed(messages) if m["role"] == "user"), ""
+        )
+        system_prompt, sources, partial = get_relevant_system_prompt(query)
+        messages[:0] = [
+            {
+                "role": "system",
+                "content": SYSTEM_PROMPT_PREFIX_PARTIAL if partial else SYSTEM_PROMPT_PREFIX,
+            },
+            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": SYSTEM_PROMPT_DIRECTIVE},
+        ]
+
+    return messages, sources
+
+
+async def _traffic_refresher():
+    """Odświeża traffic_info.txt w tle: co TRAFFIC_REFRESH_INTERVAL sekund lub na żądanie."""
+    while True:
+        _refresh_event.clear()
+        try:
+            data = await asyncio.to_thread(update_traffic_info)
+            _last_update.update(
+                changes=len(data["changes"]),
+                utrudnienia=len(data["utrudnienia"]),
+                remonty=len(data["remonty"]),
+                total=data["total_items"],
+                scraped_at=data["scraped_at"],
+            )
+        except Exception as e:
+            print(f"Ostrzeżenie: Nie udało się zaktualizować informacji: {e}")
+
+        try:
+            await asyncio.wait_for(_refresh_event.wait(), timeout=TRAFFIC_REFRESH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
 @app.get("/")
 def root():
     return {
         "status": "ok",
         "service": "OpenAI Assistant with Traffic Info",
         "model": DEFAULT_MODEL,
-        "traffic_info_available": TRAFFIC_INFO_FILE.exists(),
+        # Stan z cache (aktualizowany razem z plikiem) - bez stat() przy każdym wywołaniu
+        "traffic_info_available": _TRAFFIC_CACHE["mtime"] is not None,
     }
 
 
@@ -122,47 +400,11 @@ async def chat(request: ChatRequest):
     """
     Endpoint do rozmowy z OpenAI z automatycznym kontekstem o komunikacji miejskiej.
     """
-    # Przygotuj wiadomości
-    messages = []
-    for msg in request.messages:
-        role = msg.role
-        if role not in ["user", "assistant", "system"]:
-            role = "user"
-        messages.append({"role": role, "content": msg.content})
-
-    # Dodaj kontekst o komunikacji jeśli włączone
-    sources = []
-    if request.include_traffic_info:
-        traffic_info = load_traffic_info()
-        # Wyciągnij źródła
-        sources = extract_sources(traffic_info)
-
-        system_prompt = f"""Jesteś pomocnym asystentem informacyjnym dla mieszkańców Łodzi. Odpowiadasz TYLKO na pytania o Łodzi.
-
-WAŻNE ZASADY:
-1. Odpowiadaj TYLKO w języku naturalnym (polskim), NIE generuj kodu ani JSON
-2. Odpowiadaj krótko, konkretnie i na temat
-3. Używaj TYLKO informacji z poniższego kontekstu
-4. Jeśli pytanie NIE jest związane z Łodzią, komunikacją miejską, tramwajami, autobusami, ulicami w Łodzi - powiedz: "Przepraszam, ale moim zadaniem jest odpowiadanie tylko na pytania dotyczące Łodzi. Nie mogę pomóc w innych tematach."
-5. Jeśli linia/ulica jest wymieniona w kontekście (np. "Linie: 2, 3, 6"), oznacza to że ma utrudnienia lub zmiany
-6. Jeśli linia/ulica NIE jest wymieniona w kontekście, oznacza to że działa normalnie
-7. Podawaj źródła (linki) TYLKO gdy używasz konkretnych faktów z kontekstu - dodaj je bezpośrednio przy danym fakcie w formacie: "([źródło: link])" lub na końcu sekcji z faktami
-8. NIE dodawaj źródeł jeśli nie używasz żadnych konkretnych informacji z kontekstu
-9. NIGDY nie zwracaj JSON - tylko tekstową odpowiedź
-
-DOSTĘPNE ŹRÓDŁA (używaj ich gdy podajesz konkretne fakty):
-{chr(10).join(f"- {source}" for source in sources[:20])}
-
-AKTUALNE INFORMACJE O KOMUNIKACJI W ŁODZI:
-{traffic_info}
-
-TERAZ: Odpowiedz na pytanie użytkownika. Jeśli pytanie nie dotyczy komunikacji w Łodzi, grzecznie odmów. Jeśli używasz konkretnych faktów z powyższych informacji, podaj źródło przy danym fakcie. Odpowiadaj w języku naturalnym, NIE generuj kodu ani JSON!"""
-
-        messages.insert(0, {"role": "system", "content": system_prompt})
+    messages, sources = build_messages(request)
 
     # Wywołaj OpenAI API
     try:
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             model=request.model or DEFAULT_MODEL,
             messages=messages,
             temperature=request.temperature,
@@ -173,48 +415,33 @@ TERAZ: Odpowiedz na pytanie użytkownika. Jeśli pytanie nie dotyczy komunikacji
         if not response_text:
             raise HTTPException(status_code=500, detail="Brak odpowiedzi z OpenAI API")
 
+        # Fragmenty odpowiedzi łączymy raz, na końcu
+        parts = [response_text]
+
         # Nie dodawaj źródeł automatycznie - model powinien je podawać tylko przy konkretnych faktach
         # Sprawdzamy tylko czy odpowiedź jest związana z tematem
         if request.include_traffic_info:
+            lowered = response_text.lower()
             # Jeśli model odmówił odpowiedzi (pytanie niezwiązane z tematem), to OK
-            if "przepraszam" in response_text.lower() and (
-                "zadaniem" in response_text.lower()
-                or "nie mogę" in response_text.lower()
+            if "przepraszam" in lowered and (
+                "zadaniem" in lowered or "nie mogę" in lowered
             ):
                 # Model poprawnie odmówił - nie dodawaj nic
                 pass
             # Jeśli odpowiedź zawiera konkretne informacje o komunikacji, ale brak źródeł - możemy dodać przypis
             # Ale tylko jeśli model faktycznie użył informacji z kontekstu (np. wymienił numer linii, ulicę, itp.)
-            elif any(
-                keyword in response_text.lower()
-                for keyword in [
-                    "linia",
-                    "tramwaj",
-                    "autobus",
-                    "ul.",
-                    "ulica",
-                    "przystanek",
-                    "utrudnienie",
-                    "zmiana",
-                ]
-            ):
+            elif any(keyword in lowered for keyword in _COMM_KEYWORDS):
                 # Sprawdź czy są już źródła w odpowiedzi
-                if (
-                    "http" not in response_text
-                    and "Źródło" not in response_text
-                    and "źródło" not in response_text
-                ):
+                if not _SRC_PRESENCE_RE.search(response_text):
                     # Model użył informacji ale nie podał źródeł - możemy dodać przypis na końcu
                     # Ale tylko jeśli to faktycznie odpowiedź o komunikacji
                     if (
                         len(response_text) > 50
                     ):  # Nie dodawaj do bardzo krótkich odpowiedzi
-                        sources_text = "\n\nŹródła informacji:\n" + "\n".join(
-                            f"- {source}" for source in sources[:5]
-                        )
-                        response_text += sources_text
+                        parts.append("\n\nŹródła informacji:\n")
+                        parts.append("\n".join(f"- {source}" for source in sources[:5]))
 
-        return ChatResponse(message=response_text)
+        return ChatResponse(message="".join(parts))
 
     except Exception as e:
         error_msg = str(e)
@@ -233,27 +460,71 @@ TERAZ: Odpowiedz na pytanie użytkownika. Jeśli pytanie nie dotyczy komunikacji
             )
 
 
-@app.post("/update-traffic-info")
-def update_traffic():
-    """Aktualizuje informacje o komunikacji miejskiej."""
-    try:
-        data = update_traffic_info()
-        return {
-            "status": "ok",
-            "changes": len(data["changes"]),
-            "utrudnienia": len(data["utrudnienia"]),
-            "remonty": len(data["remonty"]),
-            "total": data["total_items"],
-            "scraped_at": data["scraped_at"],
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Błąd aktualizacji: {str(e)}")
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Strumieniowa wersja /chat (Server-Sent Events) - tokeny są wysyłane na bieżąco,
+    a na końcu przychodzi ramka ze źródłami.
+    """
+    messages, sources = build_messages(request)
+
+    async def event_stream():
+        try:
+            stream = await client.chat.completions.create(
+                model=request.model or DEFAULT_MODEL,
+                messages=messages,
+                temperature=request.temperature,
+                stream=True,
+            )
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield b"data: " + orjson.dumps({"delta": delta}) + b"\n\n"
+        except Exception as e:
+            error = {"error": f"Błąd połączenia z OpenAI API: {str(e)}"}
+            yield b"data: " + orjson.dumps(error) + b"\n\n"
+            return
+
+        yield b"data: " + orjson.dumps({"sources": sources[:5]}) + b"\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+@app.post("/update-traffic-info", status_code=202)
+async def update_traffic():
+    """Zleca aktualizację informacji o komunikacji (wykonywaną w tle) i zwraca stan ostatniej aktualizacji."""
+    if _refresh_event is None:
+        raise HTTPException(status_code=503, detail="Aktualizacja w tle nie jest uruchomiona")
+    _refresh_event.set()
+    return {"status": "accepted", **_last_update}
 
 
 @app.get("/traffic-info")
-def get_traffic_info():
-    """Zwraca aktualne informacje o komunikacji."""
-    return {"info": load_traffic_info(), "file_exists": TRAFFIC_INFO_FILE.exists()}
+def get_traffic_info(request: Request):
+    """Zwraca aktualne informacje o komunikacji (z obsługą ETag / If-None-Match)."""
+    traffic_info, _ = get_traffic_bundle()
+    mtime = _TRAFFIC_CACHE["mtime"]
+    if mtime is None:
+        return {"info": traffic_info, "file_exists": False}
+
+    etag = f'"{mtime:x}"'
+    headers = {"ETag": etag, "Cache-Control": "max-age=5"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return ORJSONResponse({"info": traffic_info, "file_exists": True}, headers=headers)
+
+
+@app.get("/traffic-info/raw")
+def get_traffic_info_raw():
+    """Zwraca plik traffic_info.txt bezpośrednio (strumieniowo, bez wczytywania do pamięci)."""
+    if not TRAFFIC_INFO_FILE.exists():
+        raise HTTPException(
+            status_code=404,
+            detail="Plik traffic_info.txt nie istnieje. Uruchom aktualizację: POST /update-traffic-info",
+        )
+    return FileResponse(TRAFFIC_INFO_FILE, media_type="text/plain; charset=utf-8")
 
 
 if __name__ == "__main__":
@@ -269,19 +540,21 @@ if __name__ == "__main__":
     # Ustaw PYTHONPATH dla procesu uvicorn (dla reload)
     os.environ["PYTHONPATH"] = str(project_root)
 
-    # Przy starcie aktualizuj informacje o komunikacji
-    print("Aktualizowanie informacji o komunikacji...")
-    try:
-        update_traffic_info()
-    except Exception as e:
-        print(f"Ostrzeżenie: Nie udało się zaktualizować informacji: {e}")
+    # Automatyczne przeładowanie przy zmianach w kodzie tylko w trybie deweloperskim (DEV_RELOAD=1).
+    # Domyślnie jeden worker: każdy worker ma własne odświeżanie traffic_info w tle, więc przy
+    # WEB_CONCURRENCY > 1 wszystkie scrapują strony MPK / lodz.pl niezależnie
+    reload = os.getenv("DEV_RELOAD", "0") == "1"
+    workers = 1 if reload else int(os.getenv("WEB_CONCURRENCY", "1"))
 
-    # Uruchom serwer z automatycznym przeładowaniem przy zmianach w kodzie
     uvicorn.run(
         "Assistant.integrated_server:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
-        reload_dirs=[str(Path(__file__).parent)],
-        reload_includes=["*.py"],
+        reload=reload,
+        workers=workers,
+        reload_dirs=[str(Path(__file__).parent)] if reload else None,
+        reload_includes=["*.py"] if reload else None,
+        # uvloop (libuv) nie działa na Windows - tam zostaje domyślna pętla asyncio
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
     )
@@ -3,30 +3,72 @@ Prosty serwer lokalnego LLM z obsługą function calling.
 Używa Ollama do uruchomienia modelu lokalnie.
 """
 
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, ConfigDict
 from typing import List, Optional, Dict, Any
-import ollama
+import httpx
 import json
+import orjson
+import os
+import asyncio
+import time
+from contextlib import asynccontextmanager
 
-app = FastAPI(title="Local LLM Assistant", version="1.0.0")
+# Endpointy są na routerze, żeby integrated_server.py mógł je dołączyć do swojej aplikacji
+# (jeden proces zamiast dwóch) - patrz OLLAMA_ROUTES_PREFIX
+router = APIRouter(default_response_class=ORJSONResponse)
 
 # Konfiguracja Ollama
 DEFAULT_MODEL = "llama3.1:8b"  # Zmień na swój model
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+
+# Współdzielony asynchroniczny klient HTTP do Ollama - nie blokuje pętli zdarzeń,
+# więc równoległe zapytania /chat mogą czekać na model jednocześnie
+ollama_client = httpx.AsyncClient(
+    base_url=OLLAMA_BASE_URL,
+    timeout=120,
+    limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+)
+
+# Ile zapytań wysyłamy do Ollama naraz łącznie - ustaw tak jak OLLAMA_NUM_PARALLEL serwera Ollama.
+# Semafor jest osobny w każdym procesie, więc limit dzielimy między workery (WEB_CONCURRENCY)
+OLLAMA_NUM_PARALLEL = int(os.getenv("OLLAMA_NUM_PARALLEL", "4"))
+WEB_WORKERS = int(os.getenv("WEB_CONCURRENCY", "1"))
+OLLAMA_SLOTS_PER_WORKER = max(1, OLLAMA_NUM_PARALLEL // WEB_WORKERS)
+_ollama_slots = asyncio.Semaphore(OLLAMA_SLOTS_PER_WORKER)
+
+_json_decoder = json.JSONDecoder()
+
+# Lista modeli prawie się nie zmienia - /models odpytuje Ollama najwyżej raz na MODELS_CACHE_TTL sekund
+MODELS_CACHE_TTL = float(os.getenv("MODELS_CACHE_TTL", "60"))
+_models_cache: Dict[str, Any] = {"fetched_at": float("-inf"), "models": []}
+
+OLLAMA_CONNECTION_ERROR = "Nie można połączyć się z Ollama. Upewnij się, że Ollama działa: ollama serve. Błąd: {}"
+
+# Modele zapytań: nadmiarowe pola są pomijane, a zwalidowane dane są niemutowalne
+REQUEST_MODEL_CONFIG = ConfigDict(extra="ignore", frozen=True)
 
 
 class Message(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
     role: str  # "user", "assistant", "system"
     content: str
 
 
 class Function(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
     name: str
     description: str
     parameters: Dict[str, Any]
 
 
 class ChatRequest(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
     messages: List[Message]
     model: Optional[str] = DEFAULT_MODEL
     functions: Optional[List[Function]] = None
@@ -38,68 +80,87 @@ class ChatResponse(BaseModel):
     function_call: Optional[Dict[str, Any]] = None
 
 
-def call_ollama(messages: List[Dict], model: str, temperature: float = 0.7) -> str:
-    """Wywołuje model Ollama używając oficjalnego klienta."""
-    try:
-        response = ollama.chat(
-            model=model, messages=messages, options={"temperature": temperature}
+class BatchChatRequest(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
+    requests: List[ChatRequest]
+
+
+def check_ollama_status(response: httpx.Response, model: str):
+    """Zamienia błędny status odpowiedzi Ollama na HTTPException."""
+    if response.status_code == 404:
+        # Ollama zwraca 404 gdy model nie jest pobrany
+        raise HTTPException(
+            status_code=404,
+            detail=f"Model '{model}' nie został znaleziony. Pobierz model: ollama pull {model}",
         )
-        if "message" not in response or "content" not in response["message"]:
-            raise HTTPException(
-                status_code=500,
-                detail="Nieprawidłowa odpowiedź z Ollama: brak zawartości wiadomości",
-            )
-        return response["message"]["content"]
-    except HTTPException:
-        # Re-raise HTTPException bez modyfikacji
-        raise
-    except (ConnectionError, OSError) as e:
-        # Łapiemy zarówno wbudowany ConnectionError jak i OSError (które mogą być używane przez ollama)
+    if response.status_code != 200:
         raise HTTPException(
-            status_code=503,
-            detail=f"Nie można połączyć się z Ollama. Upewnij się, że Ollama działa: ollama serve. Błąd: {str(e)}",
+            status_code=500, detail=f"Błąd połączenia z Ollama: {response.text}"
         )
-    except Exception as e:
-        # Sprawdzamy czy to błąd połączenia z ollama (może być ollama.ConnectionError lub podobny)
-        error_msg = str(e)
-        error_type = type(e).__name__
-
-        # Sprawdzamy czy to błąd połączenia (różne możliwe nazwy)
-        if (
-            "connection" in error_msg.lower()
-            or "connect" in error_msg.lower()
-            or "ConnectionError" in error_type
-            or isinstance(e, (ConnectionError, OSError))
-        ):
-            raise HTTPException(
-                status_code=503,
-                detail=f"Nie można połączyć się z Ollama. Upewnij się, że Ollama działa: ollama serve. Błąd: {error_msg}",
-            )
 
-        # Sprawdzamy czy to błąd brakującego modelu
-        if "model" in error_msg.lower() or "not found" in error_msg.lower():
-            raise HTTPException(
-                status_code=404,
-                detail=f"Model '{model}' nie został znaleziony. Pobierz model: ollama pull {model}",
-            )
 
-        # Inne błędy
+async def call_ollama(
+    messages: List[Dict], model: str, temperature: float = 0.7
+) -> str:
+    """Wywołuje model Ollama przez jego REST API (/api/chat)."""
+    payload = {
+        "model": model,
+        "messages": messages,
+        "stream": False,
+        "options": {"temperature": temperature},
+    }
+    try:
+        response = await ollama_client.post("/api/chat", json=payload)
+    except httpx.TransportError as e:
+        # Brak połączenia, timeout itp.
+        raise HTTPException(status_code=503, detail=OLLAMA_CONNECTION_ERROR.format(str(e)))
+
+    check_ollama_status(response, model)
+
+    data = orjson.loads(response.content)
+    if "message" not in data or "content" not in data["message"]:
         raise HTTPException(
-            status_code=500, detail=f"Błąd połączenia z Ollama: {error_msg}"
+            status_code=500,
+            detail="Nieprawidłowa odpowiedź z Ollama: brak zawartości wiadomości",
         )
+    return data["message"]["content"]
 
 
-@app.get("/")
-def root():
-    return {"status": "ok", "service": "Local LLM Assistant"}
+async def start_ollama_backend():
+    """Wypisuje wskazówkę o konfiguracji Ollama - wywołać przy starcie aplikacji."""
+    # Równoległość po naszej stronie nic nie da, jeśli Ollama obsługuje jedno zapytanie naraz
+    if WEB_WORKERS > OLLAMA_NUM_PARALLEL:
+        print(
+            f"⚠ Workerów ({WEB_WORKERS}) jest więcej niż OLLAMA_NUM_PARALLEL={OLLAMA_NUM_PARALLEL} - "
+            f"każdy dostaje 1 slot, więc do Ollama trafi do {WEB_WORKERS} zapytań naraz. "
+            "Zmniejsz WEB_CONCURRENCY."
+        )
+    print(
+        f"Wysyłamy do Ollama do {OLLAMA_SLOTS_PER_WORKER} zapytań naraz z tego workera "
+        f"(workerów: {WEB_WORKERS}, łącznie do {OLLAMA_SLOTS_PER_WORKER * WEB_WORKERS}). Uruchom Ollama z "
+        f"OLLAMA_NUM_PARALLEL={OLLAMA_NUM_PARALLEL} OLLAMA_MAX_LOADED_MODELS=1 ollama serve, "
+        "żeby faktycznie generowała je równolegle."
+    )
+
 
+async def stop_ollama_backend():
+    """Zamyka klienta Ollama - wywołać przy zamykaniu."""
+    await ollama_client.aclose()
 
-@app.post("/chat", response_model=ChatResponse)
+
+@router.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """
     Endpoint do rozmowy z LLM.
     Obsługuje function calling - jeśli model zwróci funkcję, zwrócimy ją w odpowiedzi.
     """
+    async with _ollama_slots:
+        return await handle_chat(request)
+
+
+def build_ollama_messages(request: ChatRequest) -> List[Dict[str, str]]:
+    """Konwertuje wiadomości do formatu Ollama i dodaje opis funkcji do system promptu."""
     # Konwersja wiadomości do formatu Ollama
     ollama_messages = [
         {"role": msg.role, "content": msg.content} for msg in request.messages
@@ -116,64 +177,206 @@ async def chat(request: ChatRequest):
         }
         ollama_messages.insert(0, system_msg)
 
+    return ollama_messages
+
+
+async def handle_chat(request: ChatRequest) -> ChatResponse:
+    """Obsługuje pojedynczą rozmowę: buduje prompt, wywołuje model i szuka function call."""
+    ollama_messages = build_ollama_messages(request)
+
     # Wywołaj model
-    response_text = call_ollama(ollama_messages, request.model, request.temperature)
+    response_text = await call_ollama(ollama_messages, request.model, request.temperature)
 
     # Próbuj wyciągnąć function call z odpowiedzi
-    function_call = None
-    try:
-        # Szukaj JSON w odpowiedzi
-        if "{" in response_text and "function" in response_text:
-            json_start = response_text.find("{")
-            json_end = response_text.rfind("}") + 1
-            json_str = response_text[json_start:json_end]
-            parsed = json.loads(json_str)
-            if "function" in parsed:
-                function_call = parsed
-    except:
-        pass
-
-    return ChatResponse(message=response_text, function_call=function_call)
-
-
-@app.get("/models")
-def list_models():
-    """Lista dostępnych modeli w Ollama."""
+    return ChatResponse(message=response_text, function_call=find_function_call(response_text))
+
+
+def find_function_call(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Pierwszy obiekt JSON z kluczem "function" (w dowolnym miejscu obiektu) w odpowiedzi modelu.
+    Dekodujemy od każdego "{" po kolei - raw_decode obsługuje zagnieżdżone "arguments".
+    """
+    if '"function"' not in text:
+        return None
+    start = text.find("{")
+    while start != -1:
+        try:
+            parsed, _ = _json_decoder.raw_decode(text, start)
+            if isinstance(parsed, dict) and "function" in parsed:
+                return parsed
+        except ValueError:
+            pass
+        start = text.find("{", start + 1)
+    return None
+
+
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Strumieniowa wersja /chat - tekst odpowiedzi jest wysyłany na bieżąco, fragment po fragmencie.
+    Function calling nie jest tu rozpoznawany (to robi /chat).
+    """
+    payload = {
+        "model": request.model,
+        "messages": build_ollama_messages(request),
+        "stream": True,
+        "options": {"temperature": request.temperature},
+    }
+    # Strumień otwieramy przed zwróceniem odpowiedzi, żeby brak Ollama / modelu
+    # wrócił jako zwykły kod błędu HTTP, a nie urwany strumień
+    await _ollama_slots.acquire()
+    response: Optional[httpx.Response] = None
+    released = False
+
+    async def release():
+        # Wołane z generatora i jako zadanie w tle odpowiedzi (gdy klient rozłączy się przed
+        # pierwszym fragmentem, generator w ogóle nie rusza) - zwalniamy tylko raz
+        nonlocal released
+        if released:
+            return
+        released = True
+        try:
+            if response is not None:
+                await response.aclose()
+        finally:
+            _ollama_slots.release()
+
     try:
-        models_list = ollama.list()
-        models = [model["name"] for model in models_list.get("models", [])]
-        return {"models": models}
-    except HTTPException:
-        # Re-raise HTTPException bez modyfikacji
+        try:
+            response = await ollama_client.send(
+                ollama_client.build_request("POST", "/api/chat", json=payload), stream=True
+            )
+        except httpx.TransportError as e:
+            raise HTTPException(status_code=503, detail=OLLAMA_CONNECTION_ERROR.format(str(e)))
+        if response.status_code != 200:
+            await response.aread()
+            check_ollama_status(response, request.model)
+    except BaseException:
+        await release()
         raise
-    except (ConnectionError, OSError) as e:
-        # Łapiemy zarówno wbudowany ConnectionError jak i OSError
+
+    async def token_stream():
+        try:
+            # Ollama wysyła NDJSON - jedna linia na fragment odpowiedzi
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                chunk = orjson.loads(line)
+                # Błąd w trakcie generowania przychodzi jako {"error": "..."} - przekazujemy go dalej
+                if "error" in chunk:
+                    yield f"\n[Błąd Ollama: {chunk['error']}]"
+                    return
+                content = chunk.get("message", {}).get("content")
+                if content:
+                    yield content
+        finally:
+            await release()
+
+    return StreamingResponse(
+        token_stream(),
+        media_type="text/plain; charset=utf-8",
+        background=BackgroundTask(release),
+    )
+
+
+@router.post("/chat/batch", response_model=List[ChatResponse])
+async def chat_batch(batch: BatchChatRequest):
+    """
+    Wiele rozmów w jednym zapytaniu - wysyłane do Ollama równolegle,
+    maksymalnie OLLAMA_SLOTS_PER_WORKER naraz. Odpowiedzi w kolejności zapytań.
+    """
+
+    async def run_one(request: ChatRequest) -> ChatResponse:
+        async with _ollama_slots:
+            return await handle_chat(request)
+
+    return await asyncio.gather(*(run_one(request) for request in batch.requests))
+
+
+@router.get("/health")
+async def health():
+    """Stan Ollama: załadowane modele (/api/ps) i limit równoległych zapytań po naszej stronie."""
+    try:
+        response = await ollama_client.get("/api/ps")
+    except httpx.TransportError as e:
+        raise HTTPException(status_code=503, detail=OLLAMA_CONNECTION_ERROR.format(str(e)))
+
+    if response.status_code != 200:
         raise HTTPException(
-            status_code=503,
-            detail=f"Nie można połączyć się z Ollama. Upewnij się, że Ollama działa: ollama serve. Błąd: {str(e)}",
+            status_code=500, detail=f"Błąd połączenia z Ollama: {response.text}"
         )
-    except Exception as e:
-        error_msg = str(e)
-        error_type = type(e).__name__
-
-        # Sprawdzamy czy to błąd połączenia
-        if (
-            "connection" in error_msg.lower()
-            or "connect" in error_msg.lower()
-            or "ConnectionError" in error_type
-            or isinstance(e, (ConnectionError, OSError))
-        ):
-            raise HTTPException(
-                status_code=503,
-                detail=f"Nie można połączyć się z Ollama. Upewnij się, że Ollama działa: ollama serve. Błąd: {error_msg}",
-            )
 
+    loaded = [
+        {"name": model["name"], "size_vram": model.get("size_vram")}
+        for model in orjson.loads(response.content).get("models", [])
+    ]
+    return {
+        "status": "ok",
+        "ollama_num_parallel": OLLAMA_NUM_PARALLEL,
+        "ollama_slots_per_worker": OLLAMA_SLOTS_PER_WORKER,
+        "loaded_models": loaded,
+    }
+
+
+@router.get("/models")
+async def list_models():
+    """Lista dostępnych modeli w Ollama (cache na MODELS_CACHE_TTL sekund)."""
+    now = time.monotonic()
+    if now - _models_cache["fetched_at"] < MODELS_CACHE_TTL:
+        return {"models": _models_cache["models"]}
+
+    try:
+        response = await ollama_client.get("/api/tags")
+    except httpx.TransportError as e:
+        raise HTTPException(status_code=503, detail=OLLAMA_CONNECTION_ERROR.format(str(e)))
+
+    if response.status_code != 200:
         raise HTTPException(
-            status_code=500, detail=f"Błąd połączenia z Ollama: {error_msg}"
+            status_code=500, detail=f"Błąd połączenia z Ollama: {response.text}"
         )
 
+    models = [model["name"] for model in orjson.loads(response.content).get("models", [])]
+    _models_cache.update(fetched_at=now, models=models)
+    return {"models": models}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await start_ollama_backend()
+    yield
+    await stop_ollama_backend()
+
+
+app = FastAPI(
+    title="Local LLM Assistant",
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
+app.include_router(router)
+
+
+@app.get("/")
+def root():
+    return {"status": "ok", "service": "Local LLM Assistant"}
+
 
 if __name__ == "__main__":
     import uvicorn
+    import sys
+
+    # Domyślnie nie więcej workerów niż slotów - inaczej łączny limit zapytań do Ollama przekroczy OLLAMA_NUM_PARALLEL
+    workers = int(os.getenv("WEB_CONCURRENCY", str(min(os.cpu_count() or 2, OLLAMA_NUM_PARALLEL))))
+    # Workery importują moduł od nowa - z tej zmiennej liczą swoją część OLLAMA_NUM_PARALLEL
+    os.environ["WEB_CONCURRENCY"] = str(workers)
 
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Aplikacja jako import string - wymagane przy kilku workerach
+    uvicorn.run(
+        "llm_server:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=workers,
+        # uvloop (libuv) nie działa na Windows - tam zostaje domyślna pętla asyncio
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+    )
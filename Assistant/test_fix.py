@@ -4,7 +4,17 @@ Test poprawki - sprawdza czy LLM nie zwraca kodu.
 """
 
 import requests
+from requests.adapters import HTTPAdapter
 import json
+import re
+
+# Jedna sesja z pulą połączeń dla wszystkich zapytań do serwera (keep-alive)
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=0))
+SESSION.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+
+# Ślady kodu w odpowiedzi (blok ``` lub linie import/def) - jedno przejście po tekście
+CODE_RE = re.compile(r"```|import |def ")
 
 def test_chat():
     """Test rozmowy z LLM."""
@@ -27,7 +37,7 @@ def test_chat():
     print()
     
     try:
-        response = requests.post(url, json=payload, timeout=120)
+        response = SESSION.post(url, json=payload, timeout=120)
         response.raise_for_status()
         
         result = response.json()
@@ -41,7 +51,7 @@ def test_chat():
         print()
         
         # Sprawdź czy odpowiedź zawiera kod
-        if "```" in answer or "import " in answer or "def " in answer:
+        if CODE_RE.search(answer):
             print("❌ PROBLEM: LLM zwrócił kod zamiast odpowiedzi!")
             print("   Odpowiedź zawiera elementy kodu Python")
         else:
@@ -4,7 +4,26 @@ Prosty skrypt testowy do sprawdzenia czy LLM działa.
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+import httpx
+import asyncio
 import json
+import os
+import time
+
+# Jedna sesja z pulą połączeń dla wszystkich zapytań do serwera (keep-alive)
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=0))
+SESSION.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+
+# Ile zapytań /chat wysyła naraz test obciążenia
+PARALLEL_REQUESTS = int(os.getenv("PARALLEL_REQUESTS", "8"))
+PARALLEL_PROMPTS = [
+    "Czy linia 5 działa normalnie?",
+    "Jakie są utrudnienia na Piotrkowskiej?",
+    "Które tramwaje mają zmiany w rozkładzie?",
+    "Czy są remonty torowisk?",
+]
 
 
 def test_ollama():
@@ -35,7 +54,7 @@ def test_ollama():
 def test_server():
     """Test serwera LLM."""
     try:
-        response = requests.get("http://localhost:8000/", timeout=5)
+        response = SESSION.get("http://localhost:8000/", timeout=5)
         if response.status_code == 200:
             print("✓ Serwer LLM działa!")
             print(f"  Status: {response.json()}")
@@ -53,7 +72,7 @@ def test_chat():
     """Test rozmowy z LLM."""
     try:
         print("\n📝 Test rozmowy z LLM...")
-        response = requests.post(
+        response = SESSION.post(
             "http://localhost:8000/chat",
             json={
                 "messages": [{"role": "user", "content": "Cześć! Jak się masz?"}],
@@ -80,7 +99,7 @@ def test_traffic_chat():
     """Test rozmowy z LLM z kontekstem o komunikacji."""
     try:
         print("\n🚌 Test rozmowy z LLM o komunikacji...")
-        response = requests.post(
+        response = SESSION.post(
             "http://localhost:8000/chat",
             json={
                 "messages": [
@@ -108,6 +127,48 @@ def test_traffic_chat():
         return False
 
 
+async def _parallel_chat():
+    async with httpx.AsyncClient(base_url="http://localhost:8000", timeout=120) as client:
+
+        async def one(prompt: str) -> float:
+            start = time.perf_counter()
+            response = await client.post(
+                "/chat",
+                json={
+                    "messages": [{"role": "user", "content": prompt}],
+                    "include_traffic_info": True,
+                },
+            )
+            response.raise_for_status()
+            return time.perf_counter() - start
+
+        prompts = [
+            PARALLEL_PROMPTS[i % len(PARALLEL_PROMPTS)] for i in range(PARALLEL_REQUESTS)
+        ]
+        return await asyncio.gather(*(one(p) for p in prompts), return_exceptions=True)
+
+
+def test_parallel_chat():
+    """Test obciążenia - PARALLEL_REQUESTS zapytań /chat wysłanych jednocześnie."""
+    try:
+        print(f"\n⚡ Wysyłanie {PARALLEL_REQUESTS} zapytań równolegle...")
+        start = time.perf_counter()
+        results = asyncio.run(_parallel_chat())
+        total = time.perf_counter() - start
+
+        times = [r for r in results if isinstance(r, float)]
+        errors = [r for r in results if not isinstance(r, float)]
+        if times:
+            print(f"✓ Udane: {len(times)}/{len(results)} w {total:.1f}s")
+            print(f"  Najszybsze: {min(times):.1f}s, najwolniejsze: {max(times):.1f}s")
+        for e in errors[:3]:
+            print(f"✗ Błąd: {e}")
+        return not errors
+    except Exception as e:
+        print(f"✗ Błąd: {e}")
+        return False
+
+
 if __name__ == "__main__":
     print("=" * 60)
     print("TEST SYSTEMU LLM")
@@ -140,6 +201,10 @@ if __name__ == "__main__":
         print("\n4. Test rozmowy o komunikacji...")
         test_traffic_chat()
 
+        # Test 5: Równoległe zapytania
+        print("\n5. Test równoległych zapytań...")
+        test_parallel_chat()
+
     print("\n" + "=" * 60)
     print("Test zakończony!")
     print("=" * 60)
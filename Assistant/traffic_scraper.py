@@ -6,139 +6,501 @@ Pobiera dane z:
 - lodz.pl remonty
 """
 
+import asyncio
+import httpx
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup, SoupStrainer, UnicodeDammit
+from bs4.element import CData, NavigableString, Tag
+from lxml import etree, html as lxml_html
+import orjson
 from datetime import datetime
-from typing import List, Dict, Optional
-import json
+from typing import Iterator, List, Dict, Optional, Tuple, Union
+import gzip
+import hashlib
+import io
+import os
 import re
+import threading
+import time
 from urllib.parse import urljoin
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+
+# Parser lxml (libxml2, w C) jest wielokrotnie szybszy od czysto pythonowego html.parser
+HTML_PARSER = 'lxml'
+
+# Ile podstron komunikatów MPK pobieramy naraz (pula połączeń sesji musi być co najmniej tak duża)
+MESSAGE_DETAILS_WORKERS = 8
+# Limit równoległych połączeń klienta httpx przy asynchronicznym pobieraniu komunikatów
+MESSAGE_DETAILS_ASYNC_CONNECTIONS = 16
+# Jak długo (w sekundach) używamy zapamiętanych szczegółów komunikatu zamiast pobierać go ponownie
+MESSAGE_DETAILS_TTL = 3600
+# Ile pierwszych wierszy tabeli sprawdzamy, żeby rozpoznać tabelę z komunikatem
+MESSAGE_TABLE_HEAD_ROWS = 3
+
+# Strona remontów jest duża - parsujemy tylko bloki, w których może być treść
+# (main/article/div.content i wszystko co w nich)
+REMONTY_STRAINER = SoupStrainer(['main', 'article', 'div'])
+
+# Gdzie szukać głównej treści strony: (tag, klasa) w kolejności od najważniejszego
+MPK_CONTENT = (('div', 'content'), ('main', None))
+LODZ_CONTENT = (('main', None), ('article', None), ('div', 'content'))
+
+# Poziom kompresji plików .gz (1 - najszybszy; tekst i tak kurczy się kilkukrotnie)
+GZIP_COMPRESSLEVEL = 1
+
+# Kolejność grup remontów w skonsolidowanym tekście
+REMONT_SUBTYPE_ORDER = (
+    'planowane_spotkania_2026',
+    'planowane_zmiany_ruchu',
+    'aktualne_prace',
+    'ulice_gruntowe_2025',
+    'szczegóły_remontu',
+    'inne',
+)
+
+# Wyrażenia regularne używane w pętlach - kompilowane raz
+_RE_KOMUNIKAT = re.compile(r'Komunikat\s+(\d+/\d+)', re.IGNORECASE)
+_RE_WHOLEMSG = re.compile(r'wholemessage\.jsp\?articleId=\d+')
+_RE_WHOLEMSG_ANY = re.compile(r'wholemessage')
+# Daty w formacie "Dodano dnia YYYY-MM-DD o godzinie HH:MM"
+_RE_DATE = re.compile(r'(\d{4}-\d{2}-\d{2}.*?\d{2}:\d{2})')
+# Nazwa ulicy na początku opisu remontu, np. "Piotrkowska (od Zielonej do Struga)"
+# (używane z match(), więc bez "^")
+_RE_STREET_TITLE = re.compile(r'([A-ZĄĆĘŁŃÓŚŹŻ][a-ząćęłńóśźż\s]+(?:\([^)]+\))?)')
+
+
+def _keywords_re(*keywords: str):
+    """Jedno wyrażenie (bez rozróżniania wielkości liter) dopasowujące dowolne ze słów kluczowych."""
+    return re.compile('|'.join(map(re.escape, keywords)), re.IGNORECASE)
+
+
+# Słowa kluczowe i teksty do pominięcia (menu, cookies itp.) - jedno przejście regexem zamiast
+# any(słowo in text.lower() ...) dla każdego słowa
+_RE_DETAILS_SKIP = _keywords_re('cookie', 'rodo', 'menu', 'start')
+_RE_UTRUDNIENIA_KEYWORDS = _keywords_re(
+    'utrudnienie', 'zamknięcie', 'remont', 'wypadek', 'kolizja', 'awaria', 'nie kursuje',
+    'zmiana trasy', 'objazd', 'przystanek', 'linia', 'tramwaj', 'autobus',
+)
+_RE_UTRUDNIENIA_SKIP = _keywords_re('cookie', 'rodo', 'polityka', 'menu')
+_RE_PLANNED_SKIP = _keywords_re('cookie', 'menu', 'rodo', 'więcej')
+_RE_ACTIVE_SKIP = _keywords_re(
+    'cookie', 'menu', 'rodo', 'więcej', 'polecamy', 'informacje',
+    'remonty ulic gruntowych', 'wszystkie informacje',
+)
+_RE_DIRT_ROADS_SKIP = _keywords_re(
+    'cookie', 'menu', 'rodo', 'więcej', 'polecamy', 'informacje',
+    'ulice gruntowe to', 'na 2025 r. zaplanowano', 'oto pełna lista',
+)
+_RE_REMONT_KEYWORDS = _keywords_re(
+    'zamknięta', 'objazd', 'prace prowadzone', 'remont jezdni', 'przebudowa', 'ruch', 'ulica',
+)
+_RE_REMONT_SKIP = _keywords_re('cookie', 'rodo', 'menu główne', 'przeskocz')
+
+# Początki tekstów, które nie są nazwami ulic (opisy, daty, wstępy do list)
+ACTIVE_REMONT_SKIP_PREFIXES = ('Od ', 'W ', 'Przebudowa', 'Remont')
+DIRT_ROAD_SKIP_PREFIXES = ('Na ', 'Oto ', 'Ulice ')
+
+# Skompilowane wyrażenia XPath dla stron parsowanych bezpośrednio przez lxml
+_XP_TABLES = etree.XPath('.//table')
+_XP_ROWS = etree.XPath('.//tr')
+_XP_CELLS = etree.XPath('.//td|.//th')
+_XP_LINKS = etree.XPath('.//a')
+_XP_NEXT_ROW = etree.XPath('following-sibling::tr[1]')
+_XP_PARAGRAPHS = etree.XPath('.//p|.//div|.//li')
+# Tekst elementu bez zawartości <script>/<style> (komentarze i tak nie są węzłami tekstowymi)
+_XP_TEXT = etree.XPath('.//text()[not(parent::script or parent::style)]')
+
+
+def _markup(response: requests.Response) -> Union[str, bytes]:
+    """
+    Tekst odpowiedzi do parsowania. Gdy serwer podał charset w Content-Type, dekodujemy raz
+    według niego; w przeciwnym razie oddajemy bajty i kodowanie wykrywa parser.
+    """
+    if 'charset=' in response.headers.get('Content-Type', '').lower():
+        return response.text
+    return response.content
+
+
+def _parse_html(content: Union[str, bytes]):
+    """Parsuje HTML przez lxml; kodowanie bajtów wykrywamy tak samo jak BeautifulSoup."""
+    if isinstance(content, bytes):
+        content = UnicodeDammit(content, is_html=True).unicode_markup
+    return lxml_html.document_fromstring(content)
+
+
+def _find_content(tree):
+    """Odpowiednik soup.find('div', class_='content') or soup.find('main') or soup - w jednym przejściu."""
+    main = None
+    for element in tree.iter('div', 'main'):
+        if element.tag == 'div':
+            if 'content' in (element.get('class') or '').split():
+                return element
+        elif main is None:
+            main = element
+    return main if main is not None else tree
+
+
+def _soup_texts(root, names: Tuple[str, ...]) -> List[Tuple[Tag, str]]:
+    """
+    Pary (element, element.get_text(strip=True)) dla potomków root o podanych nazwach,
+    w kolejności dokumentu. Teksty liczymy od liści w górę, więc każdy węzeł tekstowy
+    odwiedzamy raz - zamiast osobnego get_text() dla każdego (zagnieżdżonego) elementu.
+    """
+    nodes = list(root.descendants)
+    texts = {}
+    # Fragmenty tekstu dzieci zbierane od końca dla każdego rodzica
+    parts: Dict[int, List[str]] = {}
+    for node in reversed(nodes):
+        if isinstance(node, Tag):
+            fragments = parts.pop(id(node), [])
+            fragments.reverse()
+            text = ''.join(fragments)
+            if node.name in names:
+                texts[id(node)] = text
+        elif type(node) in (NavigableString, CData):
+            text = node.strip()
+        else:
+            continue  # komentarze, skrypty itp. - get_text() też je pomija
+        if text:
+            parts.setdefault(id(node.parent), []).append(text)
+    return [(node, texts[id(node)]) for node in nodes if isinstance(node, Tag) and node.name in names]
+
+
+def _find_soup_content(soup, candidates: Tuple[Tuple[str, Optional[str]], ...]):
+    """
+    Pierwszy pasujący element według kolejności kandydatów (tag, klasa) - jak łańcuch
+    soup.find(...) or soup.find(...) or soup, ale w jednym przejściu po drzewie.
+    """
+    best, best_rank = None, len(candidates)
+    for element in soup.descendants:
+        if element.name is None:
+            continue
+        for rank in range(best_rank):
+            name, class_ = candidates[rank]
+            if element.name == name and (class_ is None or class_ in element.get('class', ())):
+                best, best_rank = element, rank
+                break
+        if best_rank == 0:
+            break
+    return best if best is not None else soup
+
+
+def _text_parts(element) -> List[str]:
+    """Niepuste, przycięte fragmenty tekstu elementu lxml (jak strings z BeautifulSoup)."""
+    return [part for part in (text.strip() for text in _XP_TEXT(element)) if part]
+
+
+def _text(element, separator: str = '') -> str:
+    """Odpowiednik get_text(separator=..., strip=True) z BeautifulSoup dla elementu lxml."""
+    return separator.join(_text_parts(element))
+
+
+def _has_fewer_words(text: str, limit: int) -> bool:
+    """len(text.split()) < limit, ale bez dzielenia całego (być może długiego) tekstu na słowa."""
+    return len(text.split(maxsplit=limit - 1)) < limit
+
+
+def to_json_bytes(items: Union[Dict, List[Dict]], option: int = 0) -> bytes:
+    """
+    Serializuje zebrane dane do JSON (UTF-8) przez orjson - kształt słowników bez zmian.
+    option to flagi orjson (np. orjson.OPT_INDENT_2).
+    """
+    return orjson.dumps(items, option=option)
+
+
+@contextmanager
+def _open_output(filename: str, binary: bool, compress: bool, digest: Optional[str] = None):
+    """
+    Otwiera plik wyjściowy do zapisu - zwykły albo gzip (tekst zawsze w UTF-8).
+    Zapis idzie do pliku tymczasowego obok docelowego, podmienianego przez os.replace dopiero
+    po udanym zapisie - czytający (np. inne workery serwera) widzą cały stary albo cały nowy plik.
+    Z digest zapisuje też (atomowo) plik <filename>.sha1 ze skrótem treści i tożsamością
+    zapisanego pliku - patrz _digest_record().
+    """
+    tmp_name = f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with ExitStack() as stack:
+            f = stack.enter_context(open(tmp_name, 'wb'))
+            if compress:
+                # Nazwa docelowego pliku (nie tymczasowego) w nagłówku gzip - jak przy gzip.open
+                f = stack.enter_context(gzip.GzipFile(filename, 'wb', GZIP_COMPRESSLEVEL, f))
+            if not binary:
+                f = stack.enter_context(io.TextIOWrapper(f, encoding='utf-8'))
+            yield f
+        # i-węzeł i mtime przechodzą przez os.replace, więc bierzemy je z pliku tymczasowego
+        written = os.stat(tmp_name)
+        os.replace(tmp_name, filename)
+    except BaseException:
+        try:
+            os.remove(tmp_name)
+        except OSError:
+            pass
+        raise
+    
+    if digest is not None:
+        with _open_output(filename + '.sha1', binary=False, compress=False) as f:
+            f.write(_digest_record(digest, written))
+
+
+def _digest_record(digest: str, stat: os.stat_result) -> str:
+    """
+    Zawartość pliku .sha1: skrót treści i tożsamość pliku danych (i-węzeł, rozmiar, mtime).
+    Skrót pasuje tylko do pliku, który faktycznie zapisano razem z nim - po awarii albo gdy
+    plik nadpisał inny proces, zapis nie zostanie błędnie pominięty.
+    """
+    return f"{digest} {stat.st_ino} {stat.st_size} {stat.st_mtime_ns}"
+
+
+def _content_digest(data: Dict) -> str:
+    """SHA-1 danych bez znaczników czasu - zmienia się tylko wtedy, gdy zmieniła się sama treść."""
+    content = {key: value for key, value in data.items() if key != 'scraped_at'}
+    for key in ('changes', 'utrudnienia', 'remonty'):
+        if key in content:
+            content[key] = [
+                {field: value for field, value in item.items() if field != 'scraped_at'}
+                for item in content[key]
+            ]
+    return hashlib.sha1(to_json_bytes(content, option=orjson.OPT_SORT_KEYS)).hexdigest()
 
 
 class TrafficInfoScraper:
-    def __init__(self):
-        self.session = requests.Session()
+    def __init__(self, session: Optional[requests.Session] = None, async_fetch: bool = False):
+        # Sesję można wstrzyknąć z zewnątrz (np. współdzieloną, z większą pulą połączeń)
+        self._owns_session = session is None
+        if session is None:
+            # Własna sesja: pula połączeń keep-alive (kilkadziesiąt zapytań do tych samych hostów)
+            # i ponawianie przy chwilowych błędach serwera
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=32,
+                max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504]),
+            )
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        self.session = session
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
         self.base_url_mpk = "https://mpk.lodz.pl"
         self.base_url_lodz = "https://lodz.pl"
+        # Komunikaty MPK rzadko się zmieniają - szczegóły trzymamy między kolejnymi scrape_all()
+        self._details_cache: Dict[str, Tuple[float, Dict]] = {}
+        # Ostatnio pobrane strony: url -> (nagłówki warunkowego GET, treść) - patrz _get_page()
+        self._page_cache: Dict[str, Tuple[Dict[str, str], Union[str, bytes]]] = {}
+        # Adresy stron i komunikatów użyte od ostatniego scrape_all() - reszta wypada z cache
+        self._urls_in_use: set = set()
+        # Podstrony komunikatów pobierane na jednej pętli asyncio (httpx) zamiast puli wątków
+        self.async_fetch = async_fetch
+    
+    def close(self):
+        """Zamyka własną sesję HTTP (wstrzykniętą sesję zamyka jej właściciel)."""
+        if self._owns_session:
+            self.session.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def _get_page(self, url: str) -> Union[str, bytes]:
+        """
+        Pobiera stronę warunkowym GET (If-None-Match / If-Modified-Since), jeśli serwer podał
+        wcześniej ETag lub Last-Modified. Przy 304 używamy treści z poprzedniego pobrania.
+        """
+        self._urls_in_use.add(url)
+        cached = self._page_cache.get(url)
+        response = self.session.get(url, timeout=10, headers=cached[0] if cached else None)
+        if response.status_code == 304 and cached:
+            return cached[1]
+        response.raise_for_status()
+        markup = _markup(response)
+        
+        validators = {}
+        if response.headers.get('ETag'):
+            validators['If-None-Match'] = response.headers['ETag']
+        if response.headers.get('Last-Modified'):
+            validators['If-Modified-Since'] = response.headers['Last-Modified']
+        if validators:
+            self._page_cache[url] = (validators, markup)
+        else:
+            self._page_cache.pop(url, None)
+        return markup
     
     def scrape_message_details(self, article_url: str) -> Dict:
-        """Pobiera szczegóły komunikatu z podstrony."""
+        """Pobiera szczegóły komunikatu z podstrony (z cache na MESSAGE_DETAILS_TTL sekund)."""
+        cached = self._cached_details(article_url)
+        if cached is not None:
+            return cached
+        
+        details = self._fetch_message_details(article_url)
+        self._cache_details(article_url, details)
+        return details
+    
+    async def fetch_message_details_async(self, article_urls: List[str]) -> List[Dict]:
+        """Pobiera szczegóły wielu komunikatów naraz jednym klientem httpx (ten sam cache co wersja synchroniczna)."""
+        details_by_url = {url: self._cached_details(url) for url in article_urls}
+        to_fetch = [url for url, details in details_by_url.items() if details is None]
+        
+        if to_fetch:
+            async with httpx.AsyncClient(
+                headers=dict(self.session.headers),
+                timeout=10,
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=MESSAGE_DETAILS_ASYNC_CONNECTIONS),
+            ) as client:
+                fetched = await asyncio.gather(
+                    *(self._fetch_message_details_async(client, url) for url in to_fetch)
+                )
+            for url, details in zip(to_fetch, fetched):
+                self._cache_details(url, details)
+                details_by_url[url] = details
+        
+        return [details_by_url[url] for url in article_urls]
+    
+    def _cached_details(self, article_url: str) -> Optional[Dict]:
+        self._urls_in_use.add(article_url)
+        cached = self._details_cache.get(article_url)
+        if cached and time.monotonic() - cached[0] < MESSAGE_DETAILS_TTL:
+            return cached[1]
+        return None
+    
+    def _cache_details(self, article_url: str, details: Dict):
+        # Błędów nie zapamiętujemy - przy następnym odświeżeniu spróbujemy ponownie
+        if details:
+            self._details_cache[article_url] = (time.monotonic(), details)
+    
+    def _fetch_message_details(self, article_url: str) -> Dict:
         try:
-            response = self.session.get(article_url, timeout=10)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
+            return self._parse_message_details(self._get_page(article_url))
             
-            # Szukamy głównej treści komunikatu
-            content = soup.find('div', class_='content') or soup.find('main') or soup
+        except Exception as e:
+            print(f"Błąd przy pobieraniu szczegółów komunikatu {article_url}: {e}")
+            return {}
+    
+    async def _fetch_message_details_async(self, client: httpx.AsyncClient, article_url: str) -> Dict:
+        try:
+            response = await client.get(article_url)
+            response.raise_for_status()
+            # Parsowanie HTML w wątku, żeby nie blokować pętli zdarzeń
+            return await asyncio.to_thread(self._parse_message_details, _markup(response))
             
-            # Szukamy tabeli z komunikatem
-            tables = content.find_all('table')
-            details = {
-                'title': '',
-                'lines': [],
-                'full_text': '',
-                'komunikat_number': ''
-            }
+        except Exception as e:
+            print(f"Błąd przy pobieraniu szczegółów komunikatu {article_url}: {e}")
+            return {}
+    
+    def _parse_message_details(self, markup: Union[str, bytes]) -> Dict:
+        """Wyciąga tytuł, linie, treść i numer komunikatu z HTML podstrony."""
+        soup = BeautifulSoup(markup, HTML_PARSER)
+        
+        # Szukamy głównej treści komunikatu
+        content = _find_soup_content(soup, MPK_CONTENT)
+        
+        # Szukamy tabeli z komunikatem
+        tables = content.find_all('table')
+        details = {
+            'title': '',
+            'lines': [],
+            'full_text': '',
+            'komunikat_number': ''
+        }
+        # Linie już dodane do details['lines'] - sprawdzanie w zbiorze zamiast w liście
+        seen_lines = set()
+        
+        # Szukamy tabeli z komunikatem (pomijamy pierwszą tabelę z menu linii)
+        for table in tables:
+            # Sprawdzamy czy to tabela z komunikatem - tytuł "Od dnia ..." / "Komunikat" jest
+            # w pierwszych wierszach, więc nie przechodzimy całej (dużej) tabeli menu linii
+            head_rows = table.find_all('tr', limit=MESSAGE_TABLE_HEAD_ROWS)
+            if not any('komunikat' in row_text or 'od dnia' in row_text
+                       for row_text in (row.get_text(strip=True).lower() for row in head_rows)):
+                continue  # Pomijamy tabele z menu
             
-            # Szukamy tabeli z komunikatem (pomijamy pierwszą tabelę z menu linii)
-            for table in tables:
-                rows = table.find_all('tr')
-                # Sprawdzamy czy to tabela z komunikatem (ma wiersze z tekstem o zmianach)
-                is_message_table = False
-                for row in rows:
-                    row_text = row.get_text(strip=True)
-                    if 'komunikat' in row_text.lower() or 'od dnia' in row_text.lower():
-                        is_message_table = True
-                        break
-                
-                if not is_message_table:
-                    continue  # Pomijamy tabele z menu
-                
-                # To jest tabela z komunikatem
-                for row in rows:
-                    cells = row.find_all(['td', 'th'])
-                    if len(cells) >= 1:
-                        cell_text = cells[0].get_text(separator='\n', strip=True)
+            # To jest tabela z komunikatem - dopiero teraz pobieramy wszystkie wiersze
+            for row in table.find_all('tr'):
+                cells = row.find_all(['td', 'th'])
+                if len(cells) >= 1:
+                    cell_text = cells[0].get_text(separator='\n', strip=True)
+                    cell_text_lower = cell_text.lower()
+                    
+                    # Sprawdzamy czy to tytuł z datą i liniami
+                    if 'od dnia' in cell_text_lower and 'zmiana' in cell_text_lower:
+                        details['title'] = cell_text
                         
-                        # Sprawdzamy czy to tytuł z datą i liniami
-                        if 'od dnia' in cell_text.lower() and 'zmiana' in cell_text.lower():
-                            details['title'] = cell_text
-                            
-                            # Wyciągamy linie z tytułu (linki lub tekst)
-                            line_links = cells[0].find_all('a')
-                            for link in line_links:
-                                line_text = link.get_text(strip=True)
-                                if line_text and line_text not in details['lines']:
-                                    details['lines'].append(line_text)
+                        # Wyciągamy linie z tytułu (linki lub tekst)
+                        line_links = cells[0].find_all('a')
+                        for link in line_links:
+                            line_text = link.get_text(strip=True)
+                            if line_text and line_text not in seen_lines:
+                                seen_lines.add(line_text)
+                                details['lines'].append(line_text)
+                    
+                    # Sprawdzamy czy to treść komunikatu
+                    elif 'komunikat' in cell_text_lower or len(cell_text) > 50:
+                        if details['full_text']:
+                            details['full_text'] += '\n\n' + cell_text
+                        else:
+                            details['full_text'] = cell_text
                         
-                        # Sprawdzamy czy to treść komunikatu
-                        elif 'komunikat' in cell_text.lower() or len(cell_text) > 50:
+                        # Szukamy numeru komunikatu
+                        komunikat_match = _RE_KOMUNIKAT.search(cell_text)
+                        if komunikat_match and not details['komunikat_number']:
+                            details['komunikat_number'] = komunikat_match.group(1)
+                    
+                    # Jeśli mamy drugą kolumnę z dodatkowymi szczegółami
+                    if len(cells) >= 2:
+                        second_cell_text = cells[1].get_text(separator='\n', strip=True)
+                        if second_cell_text and len(second_cell_text) > 20:
                             if details['full_text']:
-                                details['full_text'] += '\n\n' + cell_text
+                                details['full_text'] += '\n\n' + second_cell_text
                             else:
-                                details['full_text'] = cell_text
-                            
-                            # Szukamy numeru komunikatu
-                            komunikat_match = re.search(r'Komunikat\s+(\d+/\d+)', cell_text, re.IGNORECASE)
-                            if komunikat_match and not details['komunikat_number']:
-                                details['komunikat_number'] = komunikat_match.group(1)
-                        
-                        # Jeśli mamy drugą kolumnę z dodatkowymi szczegółami
-                        if len(cells) >= 2:
-                            second_cell_text = cells[1].get_text(separator='\n', strip=True)
-                            if second_cell_text and len(second_cell_text) > 20:
-                                if details['full_text']:
-                                    details['full_text'] += '\n\n' + second_cell_text
-                                else:
-                                    details['full_text'] = second_cell_text
-            
-            # Jeśli nie znaleźliśmy w tabeli, szukamy w innych miejscach
-            if not details['full_text']:
-                # Szukamy sekcji z komunikatem
-                komunikat_section = content.find('h1') or content.find('h2')
-                if komunikat_section:
-                    details['title'] = komunikat_section.get_text(strip=True)
-                
-                # Szukamy paragrafów z treścią
-                paragraphs = content.find_all(['p', 'div'])
-                text_parts = []
-                for p in paragraphs:
-                    text = p.get_text(strip=True)
-                    if text and len(text) > 20:
-                        # Filtrujemy menu i nawigację
-                        if not any(skip in text.lower() for skip in ['cookie', 'rodo', 'menu', 'start']):
-                            text_parts.append(text)
-                
-                if text_parts:
-                    details['full_text'] = '\n\n'.join(text_parts)
+                                details['full_text'] = second_cell_text
+        
+        # Jeśli nie znaleźliśmy w tabeli, szukamy w innych miejscach
+        if not details['full_text']:
+            # Szukamy sekcji z komunikatem
+            komunikat_section = content.find('h1') or content.find('h2')
+            if komunikat_section:
+                details['title'] = komunikat_section.get_text(strip=True)
             
-            return details
+            # Szukamy paragrafów z treścią
+            paragraphs = content.find_all(['p', 'div'])
+            text_parts = []
+            for p in paragraphs:
+                text = p.get_text(strip=True)
+                if text and len(text) > 20:
+                    # Filtrujemy menu i nawigację
+                    if not _RE_DETAILS_SKIP.search(text):
+                        text_parts.append(text)
             
-        except Exception as e:
-            print(f"Błąd przy pobieraniu szczegółów komunikatu {article_url}: {e}")
-            return {}
+            if text_parts:
+                details['full_text'] = '\n\n'.join(text_parts)
+        
+        return details
     
-    def scrape_mpk_changes(self) -> List[Dict]:
-        """Pobiera informacje o zmianach rozkładów jazdy z MPK."""
+    def iter_mpk_changes(self) -> Iterator[Dict]:
+        """Pobiera informacje o zmianach rozkładów jazdy z MPK - kolejne elementy zwracane na bieżąco."""
         url = "https://mpk.lodz.pl/rozklady/zmiany.jsp"
         
         try:
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            changes = []
+            markup = self._get_page(url)
+            # Jeden znacznik czasu dla całego przebiegu - wszystkie elementy pochodzą z tego samego pobrania
+            scraped_at = datetime.now().isoformat()
+            soup = BeautifulSoup(markup, HTML_PARSER)
             
             # Szukamy sekcji z planowanymi i aktualnymi zmianami
-            content = soup.find('div', class_='content') or soup.find('main') or soup
+            content = _find_soup_content(soup, MPK_CONTENT)
             
             # Szukamy linków do szczegółowych komunikatów
-            message_links = content.find_all('a', href=re.compile(r'wholemessage\.jsp\?articleId=\d+'))
+            message_links = content.find_all('a', href=_RE_WHOLEMSG)
             
-            # Pobieramy szczegóły z komunikatów
+            # Wyznaczamy adresy komunikatów
+            linked_articles = []
             for link in message_links:
                 href = link.get('href', '')
                 if href:
@@ -149,32 +511,50 @@ class TrafficInfoScraper:
                         article_url = href
                     else:
                         article_url = f"{self.base_url_mpk}/rozklady/{href}"
+                    linked_articles.append((link, article_url))
+            
+            # Pobieramy szczegóły komunikatów równolegle (każdy adres raz) na wspólnej sesji
+            article_urls = list(dict.fromkeys(article_url for _, article_url in linked_articles))
+            if self.async_fetch:
+                details_list = asyncio.run(self.fetch_message_details_async(article_urls))
+            else:
+                with ThreadPoolExecutor(max_workers=MESSAGE_DETAILS_WORKERS) as executor:
+                    details_list = list(executor.map(self.scrape_message_details, article_urls))
+            details_by_url = dict(zip(article_urls, details_list))
+            
+            for link, article_url in linked_articles:
+                details = details_by_url[article_url]
+                if details.get('full_text') or details.get('title'):
+                    # Wyciągamy też tekst z linku (może zawierać datę)
+                    link_text = link.get_text(strip=True)
+                    parent_text = ""
+                    if link.parent:
+                        parent_text = link.parent.get_text(separator=' ', strip=True)
                     
-                    if article_url:
-                        details = self.scrape_message_details(article_url)
-                        if details.get('full_text') or details.get('title'):
-                            # Wyciągamy też tekst z linku (może zawierać datę)
-                            link_text = link.get_text(strip=True)
-                            parent_text = ""
-                            if link.parent:
-                                parent_text = link.parent.get_text(separator=' ', strip=True)
-                            
-                            change_item = {
-                                'type': 'zmiana_rozkładu',
-                                'section': 'aktualne',
-                                'title': details.get('title', link_text or parent_text),
-                                'details': details.get('full_text', ''),
-                                'lines': details.get('lines', []),
-                                'komunikat_number': details.get('komunikat_number', ''),
-                                'source': article_url,
-                                'scraped_at': datetime.now().isoformat()
-                            }
-                            
-                            # Jeśli mamy szczegóły, dodajemy je do opisu
-                            if details.get('lines'):
-                                change_item['details'] = f"Linie: {', '.join(details['lines'])}\n\n{change_item['details']}"
-                            
-                            changes.append(change_item)
+                    change_item = {
+                        'type': 'zmiana_rozkładu',
+                        'section': 'aktualne',
+                        'title': details.get('title', link_text or parent_text),
+                        'details': details.get('full_text', ''),
+                        'lines': details.get('lines', []),
+                        'komunikat_number': details.get('komunikat_number', ''),
+                        'source': article_url,
+                        'scraped_at': scraped_at
+                    }
+                    
+                    # Jeśli mamy szczegóły, dodajemy je do opisu
+                    if details.get('lines'):
+                        change_item['details'] = f"Linie: {', '.join(details['lines'])}\n\n{change_item['details']}"
+                    
+                    yield change_item
+            
+            # Elementy zawierające link do komunikatu (przodków takich linków) wyznaczamy raz -
+            # w kolejnych przejściach sprawdzamy przynależność do zbioru zamiast przeszukiwać poddrzewa
+            linked_elements = {
+                id(element)
+                for link in content.find_all('a', href=_RE_WHOLEMSG_ANY)
+                for element in link.parents
+            }
             
             # Szukamy nagłówków i list zmian (dla zmian bez linków do komunikatów)
             headings = content.find_all(['h2', 'h3', 'h4', 'strong', 'b'])
@@ -182,36 +562,36 @@ class TrafficInfoScraper:
             current_section = None
             for heading in headings:
                 text = heading.get_text(strip=True)
-                
+                text_lower = text.lower()
+
                 # Planowane zmiany
-                if 'planowane' in text.lower() or 'planowane zmiany' in text.lower():
+                if 'planowane' in text_lower:
                     current_section = "planowane"
                     continue
                 
                 # Aktualne zmiany
-                if 'aktualne' in text.lower() or 'aktualne zmiany' in text.lower():
+                if 'aktualne' in text_lower:
                     current_section = "aktualne"
                     continue
                 
                 # Jeśli to nagłówek z datą/liniami
-                if current_section and ('linii' in text.lower() or 'od dnia' in text.lower() or 
-                                       'zmiana' in text.lower()):
+                if current_section and ('linii' in text_lower or 'od dnia' in text_lower or
+                                       'zmiana' in text_lower):
                     # Sprawdzamy czy nie ma już linku do komunikatu
-                    link = heading.find('a', href=re.compile(r'wholemessage'))
-                    if not link:
+                    if id(heading) not in linked_elements:
                         # Szukamy następnych elementów z informacjami
                         next_elem = heading.find_next_sibling()
                         if next_elem:
                             details = next_elem.get_text(strip=True)
                             if details:
-                                changes.append({
+                                yield {
                                     'type': 'zmiana_rozkładu',
                                     'section': current_section,
                                     'title': text,
                                     'details': details,
                                     'source': url,
-                                    'scraped_at': datetime.now().isoformat()
-                                })
+                                    'scraped_at': scraped_at
+                                }
             
             # Alternatywnie: szukamy wszystkich elementów listy
             lists = content.find_all('ul')
@@ -219,58 +599,65 @@ class TrafficInfoScraper:
                 items = ul.find_all('li')
                 for item in items:
                     # Sprawdzamy czy nie ma już linku do komunikatu
-                    link = item.find('a', href=re.compile(r'wholemessage'))
-                    if link:
+                    if id(item) in linked_elements:
                         continue  # Już przetworzyliśmy
                     
                     text = item.get_text(strip=True)
-                    if text and ('linii' in text.lower() or 'zmiana' in text.lower() or 
-                                'od dnia' in text.lower()):
-                        changes.append({
+                    text_lower = text.lower()
+                    if text and ('linii' in text_lower or 'zmiana' in text_lower or
+                                'od dnia' in text_lower):
+                        yield {
                             'type': 'zmiana_rozkładu',
                             'section': 'aktualne',
                             'title': '',
                             'details': text,
                             'source': url,
-                            'scraped_at': datetime.now().isoformat()
-                        })
-            
-            return changes
+                            'scraped_at': scraped_at
+                        }
             
         except Exception as e:
             print(f"Błąd przy scrapowaniu zmian MPK: {e}")
             import traceback
             traceback.print_exc()
-            return []
     
-    def scrape_mpk_utrudnienia(self) -> List[Dict]:
-        """Pobiera informacje o utrudnieniach w ruchu z MPK."""
+    def scrape_mpk_changes(self) -> List[Dict]:
+        """Pobiera informacje o zmianach rozkładów jazdy z MPK."""
+        return list(self.iter_mpk_changes())
+    
+    def iter_mpk_utrudnienia(self) -> Iterator[Dict]:
+        """Pobiera informacje o utrudnieniach w ruchu z MPK - kolejne elementy zwracane na bieżąco."""
         url = "https://www.mpk.lodz.pl/rozklady/utrudnienia.jsp"
         
         try:
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
+            markup = self._get_page(url)
+            # Jeden znacznik czasu dla całego przebiegu - wszystkie elementy pochodzą z tego samego pobrania
+            scraped_at = datetime.now().isoformat()
+            # Ta strona to głównie duże tabele - parsujemy ją bezpośrednio lxml i przechodzimy
+            # po drzewie skompilowanymi wyrażeniami XPath (wykonywanymi w C)
+            tree = _parse_html(markup)
             
-            utrudnienia = []
+            found_in_table = False
             
             # Szukamy tabeli z utrudnieniami
-            tables = soup.find_all('table')
+            tables = _XP_TABLES(tree)
             
             for table in tables:
                 # Szukamy wierszy w tabeli (pomijamy nagłówek)
-                rows = table.find_all('tr')
+                rows = _XP_ROWS(table)
                 
                 for row in rows:
-                    cells = row.find_all(['td', 'th'])
+                    cells = _XP_CELLS(row)
                     
                     # Pomijamy wiersze nagłówkowe i puste
                     if len(cells) < 3:
                         continue
                     
                     # Sprawdzamy czy to wiersz z danymi (nie nagłówek)
-                    first_cell_text = cells[0].get_text(strip=True).lower()
-                    second_cell_text = cells[1].get_text(strip=True).lower() if len(cells) > 1 else ""
+                    # Tekst każdej komórki wyciągamy z drzewa raz - warianty z różnymi
+                    # separatorami składamy z tych samych fragmentów
+                    cell_parts = [_text_parts(cell) for cell in cells]
+                    first_cell_text = ''.join(cell_parts[0]).lower()
+                    second_cell_text = ''.join(cell_parts[1]).lower() if len(cells) > 1 else ""
                     
                     # Filtrujemy nagłówki tabeli
                     if ('nr linii' in first_cell_text or 
@@ -287,17 +674,17 @@ class TrafficInfoScraper:
                     
                     # Wyciągamy numery linii
                     lines = []
-                    if lines_cell:
+                    if lines_cell is not None:
                         # Szukamy linków do linii
-                        line_links = lines_cell.find_all('a')
+                        line_links = _XP_LINKS(lines_cell)
                         for link in line_links:
-                            line_text = link.get_text(strip=True)
+                            line_text = _text(link)
                             # Filtrujemy puste i nieprawidłowe wartości
                             if line_text and line_text.isdigit() or (line_text and len(line_text) <= 5):
                                 lines.append(line_text)
                         # Jeśli nie ma linków, bierzemy tekst
                         if not lines:
-                            line_text = lines_cell.get_text(strip=True)
+                            line_text = ''.join(cell_parts[0])
                             # Filtrujemy nagłówki i puste wartości
                             if (line_text and 
                                 line_text not in ['Nr linii', ''] and 
@@ -311,16 +698,16 @@ class TrafficInfoScraper:
                     
                     # Wyciągamy opis utrudnienia
                     utrudnienie_text = ""
-                    if utrudnienie_cell:
-                        utrudnienie_text = utrudnienie_cell.get_text(separator='\n', strip=True)
+                    if utrudnienie_cell is not None:
+                        utrudnienie_text = '\n'.join(cell_parts[1])
                         # Filtrujemy nagłówki
                         if 'utrudnienie w ruchu' in utrudnienie_text.lower():
                             utrudnienie_text = ""
                     
                     # Wyciągamy szczegóły zmiany sytuacji
                     zmiana_text = ""
-                    if zmiana_cell:
-                        zmiana_text = zmiana_cell.get_text(separator='\n', strip=True)
+                    if zmiana_cell is not None:
+                        zmiana_text = '\n'.join(cell_parts[2])
                         # Filtrujemy nagłówki
                         if 'zmiana sytuacji' in zmiana_text.lower() and len(zmiana_text) < 20:
                             zmiana_text = ""
@@ -328,29 +715,27 @@ class TrafficInfoScraper:
                     # Szukamy dat w całym wierszu i następnych wierszach
                     dates = []
                     # Sprawdzamy wszystkie komórki w wierszu
-                    for cell in cells:
-                        cell_text = cell.get_text(separator=' ', strip=True)
+                    for parts in cell_parts:
+                        cell_text = ' '.join(parts)
                         # Szukamy dat w formacie "Dodano dnia YYYY-MM-DD o godzinie HH:MM"
-                        date_pattern = r'(\d{4}-\d{2}-\d{2}.*?\d{2}:\d{2})'
-                        found_dates = re.findall(date_pattern, cell_text)
+                        found_dates = _RE_DATE.findall(cell_text)
                         if found_dates:
                             dates.extend(found_dates)
                     
                     # Szukamy dat w następnych wierszach (mogą być w osobnych wierszach)
-                    next_row = row.find_next_sibling('tr')
-                    if next_row:
-                        next_cells = next_row.find_all(['td', 'th'])
+                    next_rows = _XP_NEXT_ROW(row)
+                    if next_rows:
+                        next_cells = _XP_CELLS(next_rows[0])
                         for cell in next_cells:
-                            cell_text = cell.get_text(separator=' ', strip=True)
+                            cell_text = _text(cell, ' ')
                             if 'dodano dnia' in cell_text.lower():
-                                date_pattern = r'(\d{4}-\d{2}-\d{2}.*?\d{2}:\d{2})'
-                                found_dates = re.findall(date_pattern, cell_text)
+                                found_dates = _RE_DATE.findall(cell_text)
                                 if found_dates:
                                     dates.extend(found_dates)
                                     break
                     
-                    # Usuwamy duplikaty
-                    dates = list(set(dates))
+                    # Usuwamy duplikaty (z zachowaniem kolejności)
+                    dates = list(dict.fromkeys(dates))
                     
                     # Dodajemy tylko jeśli mamy przynajmniej utrudnienie lub zmianę sytuacji
                     if not utrudnienie_text and not zmiana_text:
@@ -368,7 +753,8 @@ class TrafficInfoScraper:
                         full_details.append(f"Data dodania: {', '.join(dates)}")
                     
                     if full_details:
-                        utrudnienia.append({
+                        found_in_table = True
+                        yield {
                             'type': 'utrudnienie',
                             'lines': lines,
                             'title': f"Utrudnienie na liniach: {', '.join(lines) if lines else 'nieznane'}" + 
@@ -378,63 +764,62 @@ class TrafficInfoScraper:
                             'dates': dates,
                             'details': '\n\n'.join(full_details),
                             'source': url,
-                            'scraped_at': datetime.now().isoformat()
-                        })
+                            'scraped_at': scraped_at
+                        }
             
             # Jeśli nie znaleźliśmy tabeli, próbujemy alternatywną metodę
-            if not utrudnienia:
-                content = soup.find('div', class_='content') or soup.find('main') or soup
-                paragraphs = content.find_all(['p', 'div', 'li'])
+            if not found_in_table:
+                content = _find_content(tree)
+                paragraphs = _XP_PARAGRAPHS(content)
                 
                 for p in paragraphs:
-                    text = p.get_text(strip=True)
+                    text = _text(p)
                     if not text or len(text) < 20:
                         continue
                     
-                    keywords = ['utrudnienie', 'zamknięcie', 'remont', 'wypadek', 
-                               'kolizja', 'awaria', 'nie kursuje', 'zmiana trasy',
-                               'objazd', 'przystanek', 'linia', 'tramwaj', 'autobus']
-                    
-                    if any(keyword in text.lower() for keyword in keywords):
-                        if len(text) > 50 and not any(skip in text.lower() for skip in 
-                                                      ['cookie', 'rodo', 'polityka', 'menu']):
-                            utrudnienia.append({
+                    if _RE_UTRUDNIENIA_KEYWORDS.search(text):
+                        if len(text) > 50 and not _RE_UTRUDNIENIA_SKIP.search(text):
+                            yield {
                                 'type': 'utrudnienie',
                                 'title': text[:100] + '...' if len(text) > 100 else text,
                                 'details': text,
                                 'source': url,
-                                'scraped_at': datetime.now().isoformat()
-                            })
-            
-            return utrudnienia
+                                'scraped_at': scraped_at
+                            }
             
         except Exception as e:
             print(f"Błąd przy scrapowaniu utrudnień MPK: {e}")
             import traceback
             traceback.print_exc()
-            return []
     
-    def scrape_lodz_remonty(self) -> List[Dict]:
-        """Pobiera informacje o remontach z lodz.pl."""
+    def scrape_mpk_utrudnienia(self) -> List[Dict]:
+        """Pobiera informacje o utrudnieniach w ruchu z MPK."""
+        return list(self.iter_mpk_utrudnienia())
+    
+    def iter_lodz_remonty(self) -> Iterator[Dict]:
+        """Pobiera informacje o remontach z lodz.pl - kolejne elementy zwracane na bieżąco."""
         url = "https://lodz.pl/remonty/"
         
         try:
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            remonty = []
+            markup = self._get_page(url)
+            # Jeden znacznik czasu dla całego przebiegu - wszystkie elementy pochodzą z tego samego pobrania
+            scraped_at = datetime.now().isoformat()
+            # Budujemy drzewo tylko z bloków treści - bez <head>, skryptów i stopki poza nimi
+            soup = BeautifulSoup(markup, HTML_PARSER, parse_only=REMONTY_STRAINER)
             
             # Szukamy głównej treści
-            content = soup.find('main') or soup.find('article') or soup.find('div', class_='content') or soup
+            content = _find_soup_content(soup, LODZ_CONTENT)
             
             # 1. Planowane spotkania dotyczące remontów w 2026 r.
-            headings = content.find_all(['h2', 'h3', 'h4'])
-            for heading in headings:
-                heading_text = heading.get_text(strip=True)
+            # Tekst nagłówków liczymy raz - przechodzimy po nich cztery razy
+            headings = [
+                (heading, heading.get_text(strip=True).lower())
+                for heading in content.find_all(['h2', 'h3', 'h4'])
+            ]
+            for heading, heading_text in headings:
                 
                 # Szukamy sekcji o spotkaniach
-                if 'remonty w 2026' in heading_text.lower() or 'zaplanuj z nami' in heading_text.lower():
+                if 'remonty w 2026' in heading_text or 'zaplanuj z nami' in heading_text:
                     # Szukamy tabeli ze spotkaniami
                     table = heading.find_next('table')
                     if table:
@@ -450,19 +835,18 @@ class TrafficInfoScraper:
                                     meetings.append(f"{area}: {location} - {date}")
                         
                         if meetings:
-                            remonty.append({
+                            yield {
                                 'type': 'remont',
                                 'subtype': 'planowane_spotkania_2026',
                                 'title': 'Planowane spotkania dotyczące remontów w 2026 r.',
                                 'details': '\n'.join(meetings),
                                 'source': url,
-                                'scraped_at': datetime.now().isoformat()
-                            })
+                                'scraped_at': scraped_at
+                            }
             
             # 2. Planowane zmiany w ruchu
-            for heading in headings:
-                heading_text = heading.get_text(strip=True)
-                if 'planowane zmiany w ruchu' in heading_text.lower() or 'rozpoczęcia remontów' in heading_text.lower():
+            for heading, heading_text in headings:
+                if 'planowane zmiany w ruchu' in heading_text or 'rozpoczęcia remontów' in heading_text:
                     # Szukamy listy ulic
                     next_elem = heading.find_next_sibling()
                     planned_changes = []
@@ -475,37 +859,30 @@ class TrafficInfoScraper:
                         text = current.get_text(strip=True)
                         if text and len(text) > 5 and len(text) < 200:
                             # Sprawdzamy czy to nazwa ulicy lub data
-                            if any(char.isupper() for char in text) and not any(skip in text.lower() for skip in 
-                                                                              ['cookie', 'menu', 'rodo', 'więcej']):
+                            if any(char.isupper() for char in text) and not _RE_PLANNED_SKIP.search(text):
                                 planned_changes.append(text)
                         current = current.find_next_sibling()
                         if current and current.name in ['h2', 'h3', 'h4']:
                             break
                     
                     if planned_changes:
-                        remonty.append({
+                        yield {
                             'type': 'remont',
                             'subtype': 'planowane_zmiany_ruchu',
                             'title': 'Planowane zmiany w ruchu i rozpoczęcia remontów',
                             'details': '\n'.join(planned_changes),
                             'source': url,
-                            'scraped_at': datetime.now().isoformat()
-                        })
+                            'scraped_at': scraped_at
+                        }
             
             # 3. Aktualnie prowadzone prace na drogach
-            for heading in headings:
-                heading_text = heading.get_text(strip=True)
-                if 'aktualnie prowadzone prace' in heading_text.lower() or 'prowadzone prace na drogach' in heading_text.lower():
+            for heading, heading_text in headings:
+                if 'aktualnie prowadzone prace' in heading_text or 'prowadzone prace na drogach' in heading_text:
                     # Szukamy wszystkich elementów po nagłówku do następnego nagłówka
                     active_remonts = []
-                    current = heading
-                    
-                    # Przechodzimy przez wszystkie następne elementy
-                    for _ in range(200):
-                        current = current.find_next()
-                        if not current:
-                            break
-                        
+                    seen_remonts = set()
+                    # Przechodzimy przez kolejne elementy (max 200) jednym przejściem w kolejności dokumentu
+                    for current in heading.find_all_next(limit=200):
                         # Przerywamy na następnym nagłówku
                         if current.name in ['h2', 'h3', 'h4']:
                             next_heading = current.get_text(strip=True).lower()
@@ -519,9 +896,7 @@ class TrafficInfoScraper:
                             # Filtrujemy niepotrzebne teksty
                             if not text or len(text) < 3:
                                 continue
-                            if any(skip in text.lower() for skip in 
-                                  ['cookie', 'menu', 'rodo', 'więcej', 'polecamy', 'informacje', 
-                                   'remonty ulic gruntowych', 'wszystkie informacje']):
+                            if _RE_ACTIVE_SKIP.search(text):
                                 continue
                             
                             # Sprawdzamy czy to może być nazwa ulicy
@@ -529,41 +904,32 @@ class TrafficInfoScraper:
                             # i mogą zawierać nawiasy z dodatkowymi informacjami
                             if (text[0].isupper() and 
                                 (len(text) < 100 or '(' in text or ')' in text) and
-                                not text.startswith('Od ') and
-                                not text.startswith('W ') and
-                                not text.startswith('Przebudowa') and
-                                not text.startswith('Remont')):
+                                not text.startswith(ACTIVE_REMONT_SKIP_PREFIXES)):
                                 
                                 # Sprawdzamy czy to nie jest długi opis
-                                words = text.split()
-                                if len(words) < 15:  # Krótkie teksty to prawdopodobnie nazwy ulic
-                                    if text not in active_remonts:
+                                if _has_fewer_words(text, 15):  # Krótkie teksty to prawdopodobnie nazwy ulic
+                                    if text not in seen_remonts:
+                                        seen_remonts.add(text)
                                         active_remonts.append(text)
                     
                     if active_remonts:
-                        remonty.append({
+                        yield {
                             'type': 'remont',
                             'subtype': 'aktualne_prace',
                             'title': 'Aktualnie prowadzone prace na drogach',
                             'details': '\n'.join(active_remonts),
                             'source': url,
-                            'scraped_at': datetime.now().isoformat()
-                        })
+                            'scraped_at': scraped_at
+                        }
             
             # 4. Remonty ulic gruntowych
-            for heading in headings:
-                heading_text = heading.get_text(strip=True)
-                if 'remonty ulic gruntowych' in heading_text.lower():
+            for heading, heading_text in headings:
+                if 'remonty ulic gruntowych' in heading_text:
                     # Szukamy listy ulic
                     dirt_roads = []
-                    current = heading
-                    
-                    # Przechodzimy przez wszystkie następne elementy
-                    for _ in range(200):
-                        current = current.find_next()
-                        if not current:
-                            break
-                        
+                    seen_roads = set()
+                    # Przechodzimy przez kolejne elementy (max 200) jednym przejściem w kolejności dokumentu
+                    for current in heading.find_all_next(limit=200):
                         # Przerywamy na następnym nagłówku
                         if current.name in ['h2', 'h3', 'h4']:
                             next_heading = current.get_text(strip=True).lower()
@@ -577,78 +943,72 @@ class TrafficInfoScraper:
                             # Filtrujemy niepotrzebne teksty
                             if not text or len(text) < 2:
                                 continue
-                            if any(skip in text.lower() for skip in 
-                                  ['cookie', 'menu', 'rodo', 'więcej', 'polecamy', 'informacje',
-                                   'ulice gruntowe to', 'na 2025 r. zaplanowano', 'oto pełna lista']):
+                            if _RE_DIRT_ROADS_SKIP.search(text):
                                 continue
                             
                             # Sprawdzamy czy to nazwa ulicy
                             # Nazwy ulic są krótkie, zaczynają się od dużej litery
                             if (text[0].isupper() and 
                                 len(text) < 50 and
-                                not text.startswith('Na ') and
-                                not text.startswith('Oto ') and
-                                not text.startswith('Ulice ')):
+                                not text.startswith(DIRT_ROAD_SKIP_PREFIXES)):
                                 
                                 # Sprawdzamy czy to nie jest długi opis
-                                words = text.split()
-                                if len(words) < 5:  # Bardzo krótkie teksty to prawdopodobnie nazwy ulic
-                                    if text not in dirt_roads:
+                                if _has_fewer_words(text, 5):  # Bardzo krótkie teksty to prawdopodobnie nazwy ulic
+                                    if text not in seen_roads:
+                                        seen_roads.add(text)
                                         dirt_roads.append(text)
                     
                     if dirt_roads:
-                        remonty.append({
+                        yield {
                             'type': 'remont',
                             'subtype': 'ulice_gruntowe_2025',
                             'title': 'Remonty ulic gruntowych zaplanowanych na 2025 r.',
                             'details': '\n'.join(dirt_roads),
                             'source': url,
-                            'scraped_at': datetime.now().isoformat()
-                        })
+                            'scraped_at': scraped_at
+                        }
             
             # 5. Dodatkowe szczegóły o remontach (szczegółowe opisy)
-            # Szukamy sekcji z opisami remontów
-            all_text = content.get_text(separator='\n', strip=True)
             # Szukamy sekcji z opisami ulic (zawierają szczegóły o zamknięciach, objazdach itp.)
-            paragraphs = content.find_all(['p', 'div'])
-            for p in paragraphs:
-                text = p.get_text(strip=True)
-                if len(text) > 100 and any(keyword in text.lower() for keyword in 
-                                          ['zamknięta', 'objazd', 'prace prowadzone', 'remont jezdni', 
-                                           'przebudowa', 'ruch', 'ulica']):
+            # Bloki div zawierają akapity - teksty wszystkich liczymy w jednym przejściu po drzewie
+            for p, text in _soup_texts(content, ('p', 'div')):
+                if len(text) > 100 and _RE_REMONT_KEYWORDS.search(text):
                     # Sprawdzamy czy to nie menu/nawigacja
-                    if not any(skip in text.lower() for skip in ['cookie', 'rodo', 'menu główne', 'przeskocz']):
+                    if not _RE_REMONT_SKIP.search(text):
                         # Szukamy nazwy ulicy w tekście
-                        title_match = re.search(r'^([A-ZĄĆĘŁŃÓŚŹŻ][a-ząćęłńóśźż\s]+(?:\([^)]+\))?)', text)
+                        title_match = _RE_STREET_TITLE.match(text)
                         title = title_match.group(1) if title_match else text[:80] + '...'
                         
-                        remonty.append({
+                        yield {
                             'type': 'remont',
                             'subtype': 'szczegóły_remontu',
                             'title': title,
                             'details': text,
                             'source': url,
-                            'scraped_at': datetime.now().isoformat()
-                        })
-            
-            return remonty
+                            'scraped_at': scraped_at
+                        }
             
         except Exception as e:
             print(f"Błąd przy scrapowaniu remontów lodz.pl: {e}")
             import traceback
             traceback.print_exc()
-            return []
+    
+    def scrape_lodz_remonty(self) -> List[Dict]:
+        """Pobiera informacje o remontach z lodz.pl."""
+        return list(self.iter_lodz_remonty())
     
     def scrape_all(self) -> Dict:
         """Pobiera wszystkie informacje ze wszystkich źródeł."""
-        print("Pobieranie zmian rozkładów z MPK...")
-        changes = self.scrape_mpk_changes()
-        
-        print("Pobieranie utrudnień z MPK...")
-        utrudnienia = self.scrape_mpk_utrudnienia()
-        
-        print("Pobieranie remontów z lodz.pl...")
-        remonty = self.scrape_lodz_remonty()
+        # Źródła są niezależne - pobieramy je równolegle, żeby czekanie na sieć się nakładało
+        print("Pobieranie zmian rozkładów z MPK, utrudnień z MPK i remontów z lodz.pl...")
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            changes_future = executor.submit(self.scrape_mpk_changes)
+            utrudnienia_future = executor.submit(self.scrape_mpk_utrudnienia)
+            remonty_future = executor.submit(self.scrape_lodz_remonty)
+            changes = changes_future.result()
+            utrudnienia = utrudnienia_future.result()
+            remonty = remonty_future.result()
+        self._prune_caches()
         
         return {
             'changes': changes,
@@ -658,144 +1018,178 @@ class TrafficInfoScraper:
             'total_items': len(changes) + len(utrudnienia) + len(remonty)
         }
     
+    def _prune_caches(self):
+        """
+        Usuwa z cache strony i szczegóły komunikatów, których nie użyło ostatnie scrape_all()
+        (np. wycofane komunikaty) - przy długo działającym serwerze cache nie rośnie bez końca.
+        """
+        in_use, self._urls_in_use = self._urls_in_use, set()
+        for cache in (self._page_cache, self._details_cache):
+            for url in [url for url in cache if url not in in_use]:
+                del cache[url]
+    
     def consolidate_to_text(self, data: Dict) -> str:
         """Konsoliduje wszystkie dane w jeden tekst dla LLM."""
-        text_parts = []
-        
-        text_parts.append("=" * 80)
-        text_parts.append("AKTUALNE INFORMACJE O KOMUNIKACJI MIEJSKIEJ W ŁODZI")
-        text_parts.append(f"Zaktualizowano: {data['scraped_at']}")
-        text_parts.append("=" * 80)
-        text_parts.append("")
+        return "\n".join(self._iter_consolidated_lines(data))
+    
+    def _iter_consolidated_lines(self, data: Dict) -> Iterator[str]:
+        """
+        Kolejne linie skonsolidowanego tekstu - bez budowania całej listy w pamięci.
+        Stałe grupy linii (nagłówki, separatory, zamknięcie wpisu) zwracamy jako jeden fragment.
+        """
+        yield "\n".join((
+            "=" * 80,
+            "AKTUALNE INFORMACJE O KOMUNIKACJI MIEJSKIEJ W ŁODZI",
+            f"Ostatnia zmiana informacji: {data['scraped_at']}",
+            "=" * 80,
+            "",
+        ))
         
         # Zmiany rozkładów
         if data['changes']:
-            text_parts.append("\n## ZMIANY ROZKŁADÓW JAZDY (MPK)")
-            text_parts.append("-" * 80)
+            yield "\n## ZMIANY ROZKŁADÓW JAZDY (MPK)\n" + "-" * 80
             for change in data['changes']:
                 section = change.get('section', '').upper()
                 if section:
-                    text_parts.append(f"\n[{section}]")
+                    yield f"\n[{section}]"
                 
                 # Numer komunikatu
                 if change.get('komunikat_number'):
-                    text_parts.append(f"Komunikat: {change['komunikat_number']}")
+                    yield f"Komunikat: {change['komunikat_number']}"
                 
                 # Tytuł
                 if change.get('title'):
-                    text_parts.append(f"Tytuł: {change['title']}")
+                    yield f"Tytuł: {change['title']}"
                 
                 # Linie (jeśli są osobno)
                 if change.get('lines') and not change.get('details', '').startswith('Linie:'):
-                    text_parts.append(f"Linie: {', '.join(change['lines'])}")
+                    yield f"Linie: {', '.join(change['lines'])}"
                 
                 # Szczegóły
                 if change.get('details'):
-                    text_parts.append(f"\nSzczegóły:")
-                    text_parts.append(change['details'])
+                    yield f"\nSzczegóły:\n{change['details']}"
                 
-                text_parts.append(f"\nŹródło: {change['source']}")
-                text_parts.append("")
+                yield f"\nŹródło: {change['source']}\n"
         
         # Utrudnienia
         if data['utrudnienia']:
-            text_parts.append("\n## UTRUDNIENIA W RUCHU (MPK)")
-            text_parts.append("-" * 80)
+            yield "\n## UTRUDNIENIA W RUCHU (MPK)\n" + "-" * 80
             for utrudnienie in data['utrudnienia']:
                 # Linie
                 if utrudnienie.get('lines'):
-                    text_parts.append(f"\nLinie: {', '.join(utrudnienie['lines'])}")
+                    yield f"\nLinie: {', '.join(utrudnienie['lines'])}"
                 
                 # Utrudnienie
                 if utrudnienie.get('utrudnienie'):
-                    text_parts.append(f"Utrudnienie: {utrudnienie['utrudnienie']}")
+                    yield f"Utrudnienie: {utrudnienie['utrudnienie']}"
                 
                 # Zmiana sytuacji (objazdy, komunikacja zastępcza itp.)
                 if utrudnienie.get('zmiana_sytuacji'):
-                    text_parts.append(f"\nZmiana sytuacji:")
-                    text_parts.append(utrudnienie['zmiana_sytuacji'])
+                    yield f"\nZmiana sytuacji:\n{utrudnienie['zmiana_sytuacji']}"
                 
                 # Daty
                 if utrudnienie.get('dates'):
-                    text_parts.append(f"\nData dodania: {', '.join(utrudnienie['dates'])}")
+                    yield f"\nData dodania: {', '.join(utrudnienie['dates'])}"
                 
                 # Fallback do starego formatu jeśli nowe pola nie istnieją
                 if not utrudnienie.get('utrudnienie') and not utrudnienie.get('zmiana_sytuacji'):
                     if utrudnienie.get('title'):
-                        text_parts.append(f"\n{utrudnienie['title']}")
+                        yield f"\n{utrudnienie['title']}"
                     if utrudnienie.get('details'):
-                        text_parts.append(f"{utrudnienie['details']}")
+                        yield f"{utrudnienie['details']}"
                 
-                text_parts.append(f"Źródło: {utrudnienie['source']}")
-                text_parts.append("")
+                yield f"Źródło: {utrudnienie['source']}\n"
         
         # Remonty
         if data['remonty']:
-            text_parts.append("\n## REMONTY I ZAMKNIĘCIA DRÓG (lodz.pl)")
-            text_parts.append("-" * 80)
+            yield "\n## REMONTY I ZAMKNIĘCIA DRÓG (lodz.pl)\n" + "-" * 80
             
-            # Grupujemy remonty według typu
-            by_subtype = {}
+            # Grupujemy remonty według typu w jednym przejściu; pusty subtype (np. None
+            # w ręcznie złożonych danych) trafia od razu na osobną listę
+            by_subtype = defaultdict(list)
+            untyped = []
             for remont in data['remonty']:
                 subtype = remont.get('subtype', 'inne')
-                if subtype not in by_subtype:
-                    by_subtype[subtype] = []
-                by_subtype[subtype].append(remont)
+                if subtype:
+                    by_subtype[subtype].append(remont)
+                else:
+                    untyped.append(remont)
             
             # Wyświetlamy w logicznej kolejności
-            subtype_order = [
-                'planowane_spotkania_2026',
-                'planowane_zmiany_ruchu',
-                'aktualne_prace',
-                'ulice_gruntowe_2025',
-                'szczegóły_remontu',
-                'inne'
-            ]
-            
-            for subtype in subtype_order:
-                if subtype in by_subtype:
-                    for remont in by_subtype[subtype]:
-                        if remont.get('date'):
-                            text_parts.append(f"\nData: {remont['date']}")
-                        if remont.get('title'):
-                            text_parts.append(f"\n{remont['title']}")
-                        if remont.get('details'):
-                            text_parts.append(f"\n{remont['details']}")
-                        text_parts.append(f"\nŹródło: {remont['source']}")
-                        text_parts.append("")
+            for subtype in REMONT_SUBTYPE_ORDER:
+                for remont in by_subtype.get(subtype, ()):
+                    if remont.get('date'):
+                        yield f"\nData: {remont['date']}"
+                    if remont.get('title'):
+                        yield f"\n{remont['title']}"
+                    if remont.get('details'):
+                        yield f"\n{remont['details']}"
+                    yield f"\nŹródło: {remont['source']}\n"
             
             # Jeśli są remonty bez subtype
             if 'inne' not in by_subtype:
-                for remont in data['remonty']:
-                    if not remont.get('subtype'):
-                        if remont.get('date'):
-                            text_parts.append(f"\nData: {remont['date']}")
-                        if remont.get('title'):
-                            text_parts.append(f"Tytuł: {remont['title']}")
-                        text_parts.append(f"Szczegóły: {remont['details']}")
-                        text_parts.append(f"Źródło: {remont['source']}")
-                        text_parts.append("")
+                for remont in untyped:
+                    if remont.get('date'):
+                        yield f"\nData: {remont['date']}"
+                    if remont.get('title'):
+                        yield f"Tytuł: {remont['title']}"
+                    yield f"Szczegóły: {remont['details']}"
+                    yield f"Źródło: {remont['source']}\n"
         
-        text_parts.append("\n" + "=" * 80)
-        text_parts.append(f"Łącznie znaleziono: {data['total_items']} informacji")
-        text_parts.append("=" * 80)
-        
-        return "\n".join(text_parts)
+        yield "\n".join((
+            "\n" + "=" * 80,
+            f"Łącznie znaleziono: {data['total_items']} informacji",
+            "=" * 80,
+        ))
     
-    def save_consolidated(self, data: Dict, filename: str = "traffic_info.txt"):
-        """Zapisuje skonsolidowane dane do pliku tekstowego."""
-        text = self.consolidate_to_text(data)
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write(text)
+    def save_consolidated(self, data: Dict, filename: str = "traffic_info.txt", compress: bool = False):
+        """
+        Zapisuje skonsolidowane dane do pliku tekstowego (pomija zapis, gdy treść się nie zmieniła).
+        Przy compress=True zapisuje <filename>.gz.
+        Czas w nagłówku ("Ostatnia zmiana informacji") to czas pobrania, przy którym treść
+        ostatnio się zmieniła - odświeżenia bez zmian go nie przesuwają.
+        """
+        if compress:
+            filename += '.gz'
+        digest = _content_digest(data)
+        if self._is_unchanged(filename, digest):
+            print(f"Dane bez zmian - pomijam zapis {filename}")
+            return filename
+        
+        # Linie piszemy od razu do pliku zamiast składać cały tekst w pamięci
+        lines = self._iter_consolidated_lines(data)
+        with _open_output(filename, binary=False, compress=compress, digest=digest) as f:
+            f.write(next(lines))
+            f.writelines('\n' + line for line in lines)
         print(f"Zapisano skonsolidowane dane do {filename}")
         return filename
     
-    def save_json(self, data: Dict, filename: str = "traffic_info.json"):
-        """Zapisuje surowe dane do pliku JSON."""
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+    def save_json(self, data: Dict, filename: str = "traffic_info.json", compress: bool = False):
+        """
+        Zapisuje surowe dane do pliku JSON (pomija zapis, gdy treść się nie zmieniła).
+        Przy compress=True zapisuje <filename>.gz.
+        """
+        if compress:
+            filename += '.gz'
+        digest = _content_digest(data)
+        if self._is_unchanged(filename, digest):
+            print(f"Dane bez zmian - pomijam zapis {filename}")
+            return filename
+        
+        # orjson serializuje w C prosto do bajtów UTF-8 (format jak json.dump z indent=2)
+        with _open_output(filename, binary=True, compress=compress, digest=digest) as f:
+            f.write(to_json_bytes(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
         print(f"Zapisano dane JSON do {filename}")
         return filename
+    
+    # Skrót treści ostatniego zapisu trzymamy obok pliku (np. traffic_info.txt.sha1) - przy
+    # odświeżaniu co kilka minut zwykle nic się nie zmienia i plik (oraz jego mtime) zostaje
+    def _is_unchanged(self, filename: str, digest: str) -> bool:
+        try:
+            with open(filename + '.sha1', encoding='utf-8') as f:
+                return f.read().strip() == _digest_record(digest, os.stat(filename))
+        except OSError:
+            return False
 
 
 if __name__ == "__main__":
@@ -3,28 +3,129 @@ Skrypt do konwersji plików binarnych GTFS Realtime (.bin) do formatu CSV
 """
 
 import pandas as pd
+import contextlib
+import io
 import json
+import mmap
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Union
 import struct
 
-# Próba zaimportowania bibliotek GTFS Realtime
+# Natywny backend protobuf (upb) parsuje feedy wielokrotnie szybciej niż czysty Python -
+# musi być wybrany przed pierwszym importem google.protobuf
+os.environ.setdefault("PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION", "upb")
+
+# Próba zaimportowania bibliotek GTFS Realtime (ostrzeżenia wypisuje main() - procesy robocze
+# importują ten moduł ponownie i nie powinny ich powtarzać)
 try:
     from google.transit import gtfs_realtime_pb2
+    from google.protobuf.internal import api_implementation
     GTFS_REALTIME_AVAILABLE = True
+    PROTOBUF_PURE_PYTHON = api_implementation.Type() == "python"
 except ImportError:
     GTFS_REALTIME_AVAILABLE = False
-    print("⚠ Biblioteka gtfs-realtime-bindings nie jest zainstalowana.")
-    print("  Uruchom: pip install gtfs-realtime-bindings")
-    print("  Skrypt będzie próbował parsować ręcznie.\n")
+    PROTOBUF_PURE_PYTHON = False
+
+# Opcjonalnie: szybsze wczytywanie/zapis JSON przez orjson
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Zapis tabel GTFS Realtime: "pandas" (domyślnie) albo "pyarrow" (szybszy writer w C++, ale inny
+# format: napisy w cudzysłowach, true/false, liczby całkowite bez ".0") - tylko na jawne żądanie,
+# żeby ten sam skrypt dawał te same pliki niezależnie od zainstalowanych bibliotek
+CSV_WRITER = os.getenv("BIN_TO_CSV_WRITER", "pandas")
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
 
+# Pliki większe od progu są mapowane w pamięć zamiast kopiowane do bytes
+MMAP_THRESHOLD = 1 << 20
 
-def read_binary_file(filepath: Path) -> bytes:
-    """Czyta plik binarny"""
+
+def read_binary_file(filepath: Path) -> Union[bytes, mmap.mmap]:
+    """Czyta plik binarny (duże pliki jako mmap tylko do odczytu - trzeba je zamknąć)"""
     with open(filepath, 'rb') as f:
+        if os.fstat(f.fileno()).st_size > MMAP_THRESHOLD:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
         return f.read()
 
 
+def prefetch_files(filepaths: List[Path]):
+    """
+    Zleca jądru wczytanie plików do page cache z wyprzedzeniem (POSIX_FADV_WILLNEED),
+    żeby procesy robocze czytały je już z pamięci. Na systemach bez posix_fadvise nic nie robi
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    for filepath in filepaths:
+        try:
+            fd = os.open(filepath, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+
+# Białe znaki JSON i bajty, od których może zaczynać się dokument JSON
+# (N i I - NaN/Infinity akceptowane przez json ze standardowej biblioteki)
+_JSON_WHITESPACE = b' \t\n\r'
+_JSON_START_BYTES = b'{["-0123456789tfnNI'
+
+
+def may_be_json(data: Union[bytes, mmap.mmap]) -> bool:
+    """Szybki test pierwszego niebiałego bajtu - odrzuca np. protobuf bez dekodowania całości"""
+    i = 0
+    size = len(data)
+    while i < size and data[i] in _JSON_WHITESPACE:
+        i += 1
+    return i < size and data[i] in _JSON_START_BYTES
+
+
+def json_loads(data: Union[bytes, mmap.mmap]) -> Any:
+    """
+    Dekoduje JSON prosto z bajtów (orjson, bez pośredniego str). Gdy orjson odrzuci dane,
+    decyduje json ze standardowej biblioteki - akceptuje np. NaN i liczby spoza 64 bitów
+    """
+    if not may_be_json(data):
+        raise ValueError("Dane nie zaczynają się jak dokument JSON")
+    if ORJSON_AVAILABLE:
+        try:
+            with memoryview(data) as view:
+                return orjson.loads(view)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(str(data, 'utf-8'))
+
+
+def json_dump_text(obj: Any, filepath: Path):
+    """Zapisuje obiekt jako sformatowany JSON (UTF-8, wcięcie 2)"""
+    if ORJSON_AVAILABLE:
+        try:
+            with open(filepath, 'wb') as f:
+                f.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+            return
+        except TypeError:
+            pass  # np. liczby spoza 64 bitów - zapisujemy przez json
+    with open(filepath, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, indent=2, ensure_ascii=False)
+
+
 def parse_protobuf_like_data(data: bytes) -> Dict:
     """
     Próbuje sparsować dane jako protobuf lub JSON
@@ -32,8 +133,7 @@ def parse_protobuf_like_data(data: bytes) -> Dict:
     """
     # Próba 1: Sprawdź czy to JSON
     try:
-        text = data.decode('utf-8')
-        return json.loads(text)
+        return json_loads(data)
     except:
         pass
     
@@ -49,15 +149,22 @@ def parse_protobuf_like_data(data: bytes) -> Dict:
     }
 
 
-def extract_protobuf_fields(data: bytes) -> List[Dict]:
+# Nazwy typów (wire type) protobuf, indeksowane wartością 0-7 z tagu
+_WIRE_TYPE_NAMES = ('Varint', '64-bit', 'Length-delimited', 'Start group', 'End group', '32-bit', 'Unknown', 'Unknown')
+
+
+def extract_protobuf_fields(data: bytes, max_bytes: int = 1 << 20) -> List[Dict]:
     """
     Próbuje wyekstrahować pola z danych protobuf
     Protobuf używa tagów i typów, więc próbujemy je zidentyfikować
+    Analizowane jest najwyżej max_bytes pierwszych bajtów (oprócz limitu ~1000 pól)
     """
     results = []
     i = 0
+    # Budżet bajtów - pola sięgające dalej traktujemy jak ucięte
+    end = min(len(data), max_bytes)
     
-    while i < len(data):
+    while i < end:
         try:
             # Protobuf wire types:
             # 0: Varint
@@ -65,7 +172,7 @@ def extract_protobuf_fields(data: bytes) -> List[Dict]:
             # 2: Length-delimited
             # 5: 32-bit
             
-            if i + 1 > len(data):
+            if i + 1 > end:
                 break
                 
             byte = data[i]
@@ -76,7 +183,7 @@ def extract_protobuf_fields(data: bytes) -> List[Dict]:
                 'offset': i,
                 'field_number': field_number,
                 'wire_type': wire_type,
-                'wire_type_name': ['Varint', '64-bit', 'Length-delimited', 'Start group', 'End group', '32-bit', 'Unknown'][wire_type] if wire_type < 7 else 'Unknown',
+                'wire_type_name': _WIRE_TYPE_NAMES[wire_type],
                 'raw_byte': byte
             }
             
@@ -84,24 +191,31 @@ def extract_protobuf_fields(data: bytes) -> List[Dict]:
             
             # Próbuj odczytać wartość w zależności od typu
             if wire_type == 0:  # Varint
-                value, bytes_read = read_varint(data, i)
+                # Jednobajtowy varint (najczęstszy przypadek) bez wywołania read_varint
+                if i < end and data[i] < 0x80:
+                    value, bytes_read = data[i], 1
+                else:
+                    value, bytes_read = read_varint(data, i)
                 field_info['value'] = value
                 field_info['value_bytes'] = bytes_read
                 i += bytes_read
             elif wire_type == 1:  # 64-bit
-                if i + 8 <= len(data):
+                if i + 8 <= end:
                     field_info['value'] = struct.unpack('<d', data[i:i+8])[0]
                     i += 8
             elif wire_type == 2:  # Length-delimited
-                length, bytes_read = read_varint(data, i)
+                if i < end and data[i] < 0x80:
+                    length, bytes_read = data[i], 1
+                else:
+                    length, bytes_read = read_varint(data, i)
                 field_info['length'] = length
-                if i + bytes_read + length <= len(data):
+                if i + bytes_read + length <= end:
                     field_info['value'] = data[i+bytes_read:i+bytes_read+length].hex()
                     i += bytes_read + length
                 else:
                     break
             elif wire_type == 5:  # 32-bit
-                if i + 4 <= len(data):
+                if i + 4 <= end:
                     field_info['value'] = struct.unpack('<f', data[i:i+4])[0]
                     i += 4
             else:
@@ -109,18 +223,18 @@ def extract_protobuf_fields(data: bytes) -> List[Dict]:
             
             results.append(field_info)
             
-            if i >= len(data) or len(results) > 1000:  # Limit dla bezpieczeństwa
+            if i >= end or len(results) > 1000:  # Limit dla bezpieczeństwa
                 break
                 
         except Exception as e:
             field_info = {
                 'offset': i,
                 'error': str(e),
-                'raw_byte': data[i] if i < len(data) else None
+                'raw_byte': data[i] if i < end else None
             }
             results.append(field_info)
             i += 1
-            if i >= len(data):
+            if i >= end:
                 break
     
     return results
@@ -128,6 +242,10 @@ def extract_protobuf_fields(data: bytes) -> List[Dict]:
 
 def read_varint(data: bytes, start: int) -> tuple:
     """Czyta varint z danych"""
+    # Szybka ścieżka: varint mieszczący się w jednym bajcie (małe liczby i długości)
+    if start < len(data) and not (data[start] & 0x80):
+        return data[start], 1
+    
     result = 0
     shift = 0
     bytes_read = 0
@@ -143,14 +261,251 @@ def read_varint(data: bytes, start: int) -> tuple:
     return result, bytes_read
 
 
-def parse_gtfs_realtime(data: bytes, file_type: str) -> Optional[Dict]:
-    """Parsuje dane GTFS Realtime używając oficjalnej biblioteki"""
+# Konwersja podwiadomości GTFS Realtime na słowniki. Każda pobiera podwiadomość i jej HasField
+# raz (zamiast wielokrotnego tu.trip.HasField(...) w wyrażeniach) - przy tysiącach encji
+# dostęp do atrybutów protobuf dominuje czas parsowania.
+def _trip_to_dict(trip) -> Dict:
+    has = trip.HasField
+    return {
+        'trip_id': trip.trip_id or None,
+        'route_id': trip.route_id or None,
+        'direction_id': trip.direction_id if has('direction_id') else None,
+        'start_time': trip.start_time or None,
+        'start_date': trip.start_date or None,
+        'schedule_relationship': trip.schedule_relationship
+    }
+
+
+def _vehicle_to_dict(vehicle) -> Dict:
+    return {
+        'id': vehicle.id or None,
+        'label': vehicle.label or None,
+        'license_plate': vehicle.license_plate or None
+    }
+
+
+def _position_to_dict(position) -> Dict:
+    has = position.HasField
+    return {
+        'latitude': position.latitude if has('latitude') else None,
+        'longitude': position.longitude if has('longitude') else None,
+        'bearing': position.bearing if has('bearing') else None,
+        'odometer': position.odometer if has('odometer') else None,
+        'speed': position.speed if has('speed') else None
+    }
+
+
+def _stop_time_event_to_dict(event) -> Dict:
+    has = event.HasField
+    return {
+        'delay': event.delay if has('delay') else None,
+        'time': event.time if has('time') else None,
+        'uncertainty': event.uncertainty if has('uncertainty') else None
+    }
+
+
+def _stop_time_update_to_dict(stu) -> Dict:
+    has = stu.HasField
+    return {
+        'stop_sequence': stu.stop_sequence if has('stop_sequence') else None,
+        'stop_id': stu.stop_id or None,
+        'arrival': _stop_time_event_to_dict(stu.arrival) if has('arrival') else None,
+        'departure': _stop_time_event_to_dict(stu.departure) if has('departure') else None,
+        'schedule_relationship': stu.schedule_relationship
+    }
+
+
+def _informed_entity_to_dict(ie) -> Dict:
+    has = ie.HasField
+    return {
+        'agency_id': ie.agency_id or None,
+        'route_id': ie.route_id or None,
+        'route_type': ie.route_type if has('route_type') else None,
+        'trip': _trip_to_dict(ie.trip) if has('trip') else None,
+        'stop_id': ie.stop_id or None
+    }
+
+
+def _translated_to_dict(translated) -> Dict:
+    return {
+        'translation': [
+            {
+                'text': t.text or None,
+                'language': t.language or None
+            }
+            for t in translated.translation
+        ]
+    }
+
+
+def _optional(message, field: str):
+    """Wartość pola podwiadomości albo None, gdy podwiadomości lub pola nie ustawiono"""
+    if message is not None and message.HasField(field):
+        return getattr(message, field)
+    return None
+
+
+def _gtfs_realtime_columns(entities) -> Dict[str, Dict[str, list]]:
+    """
+    Buduje tabele CSV (entities, trip_updates, vehicle_positions, alerts) jako kolumny
+    (słownik list) bezpośrednio z wiadomości protobuf, bez pośrednich słowników na encję
+    """
+    n = len(entities)
+    entity_cols = {
+        'entity_id': [None] * n,
+        'is_deleted': [None] * n,
+        'has_trip_update': [None] * n,
+        'has_vehicle_position': [None] * n,
+        'has_alert': [None] * n,
+    }
+    tu_cols = {name: [] for name in (
+        'entity_id', 'trip_id', 'route_id', 'stop_id', 'stop_sequence', 'arrival_delay',
+        'arrival_time', 'departure_delay', 'departure_time', 'schedule_relationship')}
+    vp_cols = {name: [] for name in (
+        'entity_id', 'trip_id', 'route_id', 'vehicle_id', 'latitude', 'longitude', 'speed',
+        'bearing', 'current_stop_id', 'current_stop_sequence', 'current_status', 'timestamp',
+        'congestion_level', 'occupancy_status')}
+    alert_cols = {name: [] for name in (
+        'entity_id', 'cause', 'effect', 'agency_id', 'route_id', 'route_type', 'trip_id', 'stop_id')}
+    
+    def group(names):
+        # Kolumny grupy (tu_/vp_/alert_) dokładane przy pierwszym wystąpieniu - zachowuje
+        # kolejność kolumn taką, jak przy budowaniu DataFrame z listy słowników
+        if names[0] not in entity_cols:
+            for name in names:
+                entity_cols[name] = [None] * n
+        return [entity_cols[name] for name in names]
+    
+    for i, entity in enumerate(entities):
+        entity_id = entity.id
+        has_field = entity.HasField
+        has_tu = has_field('trip_update')
+        has_vp = has_field('vehicle')
+        has_alert = has_field('alert')
+        entity_cols['entity_id'][i] = entity_id
+        entity_cols['is_deleted'][i] = entity.is_deleted
+        entity_cols['has_trip_update'][i] = has_tu
+        entity_cols['has_vehicle_position'][i] = has_vp
+        entity_cols['has_alert'][i] = has_alert
+        
+        # Trip Update
+        if has_tu:
+            tu = entity.trip_update
+            trip = tu.trip
+            trip_id = trip.trip_id or None
+            route_id = trip.route_id or None
+            stop_time_updates = tu.stop_time_update
+            row = (
+                trip_id,
+                route_id,
+                trip.direction_id if trip.HasField('direction_id') else None,
+                trip.start_time or None,
+                (tu.vehicle.id or None) if tu.HasField('vehicle') else None,
+                len(stop_time_updates),
+            )
+            for col, value in zip(group(('tu_trip_id', 'tu_route_id', 'tu_direction_id', 'tu_start_time',
+                                         'tu_vehicle_id', 'tu_stop_updates_count')), row):
+                col[i] = value
+            
+            for stu in stop_time_updates:
+                stu_has = stu.HasField
+                arrival = stu.arrival if stu_has('arrival') else None
+                departure = stu.departure if stu_has('departure') else None
+                tu_cols['entity_id'].append(entity_id)
+                tu_cols['trip_id'].append(trip_id)
+                tu_cols['route_id'].append(route_id)
+                tu_cols['stop_id'].append(stu.stop_id or None)
+                tu_cols['stop_sequence'].append(stu.stop_sequence if stu_has('stop_sequence') else None)
+                tu_cols['arrival_delay'].append(_optional(arrival, 'delay'))
+                tu_cols['arrival_time'].append(_optional(arrival, 'time'))
+                tu_cols['departure_delay'].append(_optional(departure, 'delay'))
+                tu_cols['departure_time'].append(_optional(departure, 'time'))
+                tu_cols['schedule_relationship'].append(stu.schedule_relationship)
+        
+        # Vehicle Position
+        if has_vp:
+            vp = entity.vehicle
+            vp_has = vp.HasField
+            trip = vp.trip if vp_has('trip') else None
+            position = vp.position if vp_has('position') else None
+            trip_id = (trip.trip_id or None) if trip else None
+            route_id = (trip.route_id or None) if trip else None
+            vehicle_id = (vp.vehicle.id or None) if vp_has('vehicle') else None
+            latitude = _optional(position, 'latitude')
+            longitude = _optional(position, 'longitude')
+            speed = _optional(position, 'speed')
+            bearing = _optional(position, 'bearing')
+            stop_id = vp.stop_id or None
+            current_status = vp.current_status
+            timestamp = vp.timestamp if vp_has('timestamp') else None
+            row = (trip_id, route_id, vehicle_id, latitude, longitude, speed, bearing,
+                   stop_id, current_status, timestamp)
+            for col, value in zip(group(('vp_trip_id', 'vp_route_id', 'vp_vehicle_id', 'vp_latitude',
+                                         'vp_longitude', 'vp_speed', 'vp_bearing', 'vp_current_stop_id',
+                                         'vp_current_status', 'vp_timestamp')), row):
+                col[i] = value
+            
+            vp_cols['entity_id'].append(entity_id)
+            vp_cols['trip_id'].append(trip_id)
+            vp_cols['route_id'].append(route_id)
+            vp_cols['vehicle_id'].append(vehicle_id)
+            vp_cols['latitude'].append(latitude)
+            vp_cols['longitude'].append(longitude)
+            vp_cols['speed'].append(speed)
+            vp_cols['bearing'].append(bearing)
+            vp_cols['current_stop_id'].append(stop_id)
+            vp_cols['current_stop_sequence'].append(
+                vp.current_stop_sequence if vp_has('current_stop_sequence') else None)
+            vp_cols['current_status'].append(current_status)
+            vp_cols['timestamp'].append(timestamp)
+            vp_cols['congestion_level'].append(vp.congestion_level)
+            vp_cols['occupancy_status'].append(vp.occupancy_status)
+        
+        # Alert
+        if has_alert:
+            alert = entity.alert
+            cause = alert.cause
+            effect = alert.effect
+            informed_entities = alert.informed_entity
+            row = (cause, effect, len(alert.active_period), len(informed_entities))
+            for col, value in zip(group(('alert_cause', 'alert_effect', 'alert_active_periods',
+                                         'alert_informed_entities')), row):
+                col[i] = value
+            
+            for ie in informed_entities:
+                ie_has = ie.HasField
+                alert_cols['entity_id'].append(entity_id)
+                alert_cols['cause'].append(cause)
+                alert_cols['effect'].append(effect)
+                alert_cols['agency_id'].append(ie.agency_id or None)
+                alert_cols['route_id'].append(ie.route_id or None)
+                alert_cols['route_type'].append(ie.route_type if ie_has('route_type') else None)
+                alert_cols['trip_id'].append((ie.trip.trip_id or None) if ie_has('trip') else None)
+                alert_cols['stop_id'].append(ie.stop_id or None)
+    
+    return {
+        'entities': entity_cols,
+        'trip_updates': tu_cols,
+        'vehicle_positions': vp_cols,
+        'alerts': alert_cols,
+    }
+
+
+def parse_gtfs_realtime(data: bytes, file_type: str, collect_columns: bool = False) -> Optional[Dict]:
+    """
+    Parsuje dane GTFS Realtime używając oficjalnej biblioteki
+    
+    Z collect_columns=True zamiast listy zagnieżdżonych słowników encji zwraca od razu
+    kolumny tabel CSV ('columns') i liczbę encji ('entity_count')
+    """
     if not GTFS_REALTIME_AVAILABLE:
         return None
     
     try:
         feed_message = gtfs_realtime_pb2.FeedMessage()
-        feed_message.ParseFromString(data)
+        # memoryview - backend upb nie przyjmuje bezpośrednio mmap
+        with memoryview(data) as view:
+            feed_message.ParseFromString(view)
         
         result = {
             'header': {
@@ -161,85 +516,48 @@ def parse_gtfs_realtime(data: bytes, file_type: str) -> Optional[Dict]:
             'entities': []
         }
         
+        if collect_columns:
+            del result['entities']
+            result['entity_count'] = len(feed_message.entity)
+            result['columns'] = _gtfs_realtime_columns(feed_message.entity)
+            return result
+        
         for entity in feed_message.entity:
             entity_data = {
                 'id': entity.id,
                 'is_deleted': entity.is_deleted,
             }
+            has_field = entity.HasField
             
             # Trip Updates
-            if entity.HasField('trip_update'):
+            if has_field('trip_update'):
                 tu = entity.trip_update
                 entity_data['trip_update'] = {
-                    'trip': {
-                        'trip_id': tu.trip.trip_id if tu.trip.trip_id else None,
-                        'route_id': tu.trip.route_id if tu.trip.route_id else None,
-                        'direction_id': tu.trip.direction_id if tu.trip.HasField('direction_id') else None,
-                        'start_time': tu.trip.start_time if tu.trip.start_time else None,
-                        'start_date': tu.trip.start_date if tu.trip.start_date else None,
-                        'schedule_relationship': tu.trip.schedule_relationship
-                    },
-                    'vehicle': {
-                        'id': tu.vehicle.id if tu.vehicle.id else None,
-                        'label': tu.vehicle.label if tu.vehicle.label else None,
-                        'license_plate': tu.vehicle.license_plate if tu.vehicle.license_plate else None
-                    } if tu.HasField('vehicle') else None,
-                    'stop_time_updates': []
+                    'trip': _trip_to_dict(tu.trip),
+                    'vehicle': _vehicle_to_dict(tu.vehicle) if tu.HasField('vehicle') else None,
+                    'stop_time_updates': [_stop_time_update_to_dict(stu) for stu in tu.stop_time_update]
                 }
-                
-                for stu in tu.stop_time_update:
-                    stu_data = {
-                        'stop_sequence': stu.stop_sequence if stu.HasField('stop_sequence') else None,
-                        'stop_id': stu.stop_id if stu.stop_id else None,
-                        'arrival': {
-                            'delay': stu.arrival.delay if stu.arrival.HasField('delay') else None,
-                            'time': stu.arrival.time if stu.arrival.HasField('time') else None,
-                            'uncertainty': stu.arrival.uncertainty if stu.arrival.HasField('uncertainty') else None
-                        } if stu.HasField('arrival') else None,
-                        'departure': {
-                            'delay': stu.departure.delay if stu.departure.HasField('delay') else None,
-                            'time': stu.departure.time if stu.departure.HasField('time') else None,
-                            'uncertainty': stu.departure.uncertainty if stu.departure.HasField('uncertainty') else None
-                        } if stu.HasField('departure') else None,
-                        'schedule_relationship': stu.schedule_relationship
-                    }
-                    entity_data['trip_update']['stop_time_updates'].append(stu_data)
             
             # Vehicle Positions
-            if entity.HasField('vehicle'):
+            if has_field('vehicle'):
                 vp = entity.vehicle
+                vp_has = vp.HasField
                 entity_data['vehicle_position'] = {
-                    'trip': {
-                        'trip_id': vp.trip.trip_id if vp.trip.trip_id else None,
-                        'route_id': vp.trip.route_id if vp.trip.route_id else None,
-                        'direction_id': vp.trip.direction_id if vp.trip.HasField('direction_id') else None,
-                        'start_time': vp.trip.start_time if vp.trip.start_time else None,
-                        'start_date': vp.trip.start_date if vp.trip.start_date else None,
-                        'schedule_relationship': vp.trip.schedule_relationship
-                    } if vp.HasField('trip') else None,
-                    'vehicle': {
-                        'id': vp.vehicle.id if vp.vehicle.id else None,
-                        'label': vp.vehicle.label if vp.vehicle.label else None,
-                        'license_plate': vp.vehicle.license_plate if vp.vehicle.license_plate else None
-                    } if vp.HasField('vehicle') else None,
-                    'position': {
-                        'latitude': vp.position.latitude if vp.position.HasField('latitude') else None,
-                        'longitude': vp.position.longitude if vp.position.HasField('longitude') else None,
-                        'bearing': vp.position.bearing if vp.position.HasField('bearing') else None,
-                        'odometer': vp.position.odometer if vp.position.HasField('odometer') else None,
-                        'speed': vp.position.speed if vp.position.HasField('speed') else None
-                    } if vp.HasField('position') else None,
-                    'current_stop_sequence': vp.current_stop_sequence if vp.HasField('current_stop_sequence') else None,
-                    'stop_id': vp.stop_id if vp.stop_id else None,
+                    'trip': _trip_to_dict(vp.trip) if vp_has('trip') else None,
+                    'vehicle': _vehicle_to_dict(vp.vehicle) if vp_has('vehicle') else None,
+                    'position': _position_to_dict(vp.position) if vp_has('position') else None,
+                    'current_stop_sequence': vp.current_stop_sequence if vp_has('current_stop_sequence') else None,
+                    'stop_id': vp.stop_id or None,
                     'current_status': vp.current_status,
-                    'timestamp': vp.timestamp if vp.HasField('timestamp') else None,
+                    'timestamp': vp.timestamp if vp_has('timestamp') else None,
                     'congestion_level': vp.congestion_level,
                     'occupancy_status': vp.occupancy_status
                 }
             
             # Alerts
-            if entity.HasField('alert'):
+            if has_field('alert'):
                 alert = entity.alert
+                alert_has = alert.HasField
                 entity_data['alert'] = {
                     'active_period': [
                         {
@@ -248,52 +566,14 @@ def parse_gtfs_realtime(data: bytes, file_type: str) -> Optional[Dict]:
                         }
                         for ap in alert.active_period
                     ],
-                    'informed_entity': [
-                        {
-                            'agency_id': ie.agency_id if ie.agency_id else None,
-                            'route_id': ie.route_id if ie.route_id else None,
-                            'route_type': ie.route_type if ie.HasField('route_type') else None,
-                            'trip': {
-                                'trip_id': ie.trip.trip_id if ie.trip.trip_id else None,
-                                'route_id': ie.trip.route_id if ie.trip.route_id else None,
-                                'direction_id': ie.trip.direction_id if ie.trip.HasField('direction_id') else None,
-                                'start_time': ie.trip.start_time if ie.trip.start_time else None,
-                                'start_date': ie.trip.start_date if ie.trip.start_date else None,
-                                'schedule_relationship': ie.trip.schedule_relationship
-                            } if ie.HasField('trip') else None,
-                            'stop_id': ie.stop_id if ie.stop_id else None
-                        }
-                        for ie in alert.informed_entity
-                    ],
+                    'informed_entity': [_informed_entity_to_dict(ie) for ie in alert.informed_entity],
                     'cause': alert.cause,
                     'effect': alert.effect,
-                    'url': {
-                        'translation': [
-                            {
-                                'text': t.text if t.text else None,
-                                'language': t.language if t.language else None
-                            }
-                            for t in alert.url.translation
-                        ]
-                    } if alert.HasField('url') else None,
-                    'header_text': {
-                        'translation': [
-                            {
-                                'text': t.text if t.text else None,
-                                'language': t.language if t.language else None
-                            }
-                            for t in alert.header_text.translation
-                        ]
-                    } if alert.HasField('header_text') else None,
-                    'description_text': {
-                        'translation': [
-                            {
-                                'text': t.text if t.text else None,
-                                'language': t.language if t.language else None
-                            }
-                            for t in alert.description_text.translation
-                        ]
-                    } if alert.HasField('description_text') else None
+                    'url': _translated_to_dict(alert.url) if alert_has('url') else None,
+                    'header_text': _translated_to_dict(alert.header_text) if alert_has('header_text') else None,
+                    'description_text': (
+                        _translated_to_dict(alert.description_text) if alert_has('description_text') else None
+                    )
                 }
             
             result['entities'].append(entity_data)
@@ -310,7 +590,15 @@ def analyze_binary_file(filepath: Path) -> Dict:
     print(f"Rozmiar: {filepath.stat().st_size} bajtów")
     
     data = read_binary_file(filepath)
-    
+    try:
+        return _analyze_data(filepath, data)
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
+
+
+def _analyze_data(filepath: Path, data: Union[bytes, mmap.mmap]) -> Dict:
+    """Właściwa analiza zawartości pliku (bytes albo mmap)"""
     # Podstawowa analiza
     analysis = {
         'filename': filepath.name,
@@ -321,13 +609,13 @@ def analyze_binary_file(filepath: Path) -> Dict:
     
     # Próba parsowania jako GTFS Realtime
     print("  Próba parsowania jako GTFS Realtime...")
-    gtfs_data = parse_gtfs_realtime(data, filepath.name)
+    gtfs_data = parse_gtfs_realtime(data, filepath.name, collect_columns=True)
     if gtfs_data:
         analysis['gtfs_realtime'] = gtfs_data
         analysis['is_gtfs_realtime'] = True
         print(f"  ✓ Plik jest w formacie GTFS Realtime!")
         print(f"    Wersja: {gtfs_data['header']['gtfs_realtime_version']}")
-        print(f"    Liczba encji: {len(gtfs_data['entities'])}")
+        print(f"    Liczba encji: {gtfs_data['entity_count']}")
     else:
         analysis['is_gtfs_realtime'] = False
     
@@ -345,8 +633,7 @@ def analyze_binary_file(filepath: Path) -> Dict:
     
     # Próba jako JSON
     try:
-        text = data.decode('utf-8')
-        json_data = json.loads(text)
+        json_data = json_loads(data)
         analysis['is_json'] = True
         analysis['json_data'] = json_data
         print("  ✓ Plik jest w formacie JSON")
@@ -356,6 +643,21 @@ def analyze_binary_file(filepath: Path) -> Dict:
     return analysis
 
 
+def write_columns_csv(columns: Dict[str, list], path: Path) -> int:
+    """Zapisuje tabelę w postaci kolumn (słownik list) do CSV i zwraca liczbę wierszy"""
+    if CSV_WRITER == "pyarrow" and PYARROW_AVAILABLE:
+        try:
+            pa_csv.write_csv(pa.Table.from_pydict(columns), path,
+                             write_options=pa_csv.WriteOptions(quoting_style='needed'))
+            return len(next(iter(columns.values())))
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            pass  # np. kolumna o mieszanych typach - zapisujemy przez pandas
+    
+    df = pd.DataFrame(columns)
+    df.to_csv(path, index=False)
+    return len(df)
+
+
 def save_to_csv(analysis: Dict, output_dir: Path):
     """Zapisuje analizę do plików CSV"""
     filename = analysis['filename']
@@ -382,140 +684,12 @@ def save_to_csv(analysis: Dict, output_dir: Path):
         header_df.to_csv(output_dir / f"{base_name}_header.csv", index=False)
         print(f"  ✓ Zapisano {base_name}_header.csv")
         
-        # Entities - rozwijamy do płaskiej struktury
-        entities_list = []
-        for entity in gtfs['entities']:
-            entity_row = {
-                'entity_id': entity['id'],
-                'is_deleted': entity['is_deleted'],
-                'has_trip_update': 'trip_update' in entity,
-                'has_vehicle_position': 'vehicle_position' in entity,
-                'has_alert': 'alert' in entity
-            }
-            
-            # Trip Update
-            if 'trip_update' in entity:
-                tu = entity['trip_update']
-                entity_row.update({
-                    'tu_trip_id': tu['trip']['trip_id'] if tu['trip'] else None,
-                    'tu_route_id': tu['trip']['route_id'] if tu['trip'] else None,
-                    'tu_direction_id': tu['trip']['direction_id'] if tu['trip'] else None,
-                    'tu_start_time': tu['trip']['start_time'] if tu['trip'] else None,
-                    'tu_vehicle_id': tu['vehicle']['id'] if tu['vehicle'] else None,
-                    'tu_stop_updates_count': len(tu['stop_time_updates'])
-                })
-            
-            # Vehicle Position
-            if 'vehicle_position' in entity:
-                vp = entity['vehicle_position']
-                entity_row.update({
-                    'vp_trip_id': vp['trip']['trip_id'] if vp['trip'] else None,
-                    'vp_route_id': vp['trip']['route_id'] if vp['trip'] else None,
-                    'vp_vehicle_id': vp['vehicle']['id'] if vp['vehicle'] else None,
-                    'vp_latitude': vp['position']['latitude'] if vp['position'] else None,
-                    'vp_longitude': vp['position']['longitude'] if vp['position'] else None,
-                    'vp_speed': vp['position']['speed'] if vp['position'] else None,
-                    'vp_bearing': vp['position']['bearing'] if vp['position'] else None,
-                    'vp_current_stop_id': vp['stop_id'],
-                    'vp_current_status': vp['current_status'],
-                    'vp_timestamp': vp['timestamp']
-                })
-            
-            # Alert
-            if 'alert' in entity:
-                alert = entity['alert']
-                entity_row.update({
-                    'alert_cause': alert['cause'],
-                    'alert_effect': alert['effect'],
-                    'alert_active_periods': len(alert['active_period']),
-                    'alert_informed_entities': len(alert['informed_entity'])
-                })
-            
-            entities_list.append(entity_row)
-        
-        if entities_list:
-            entities_df = pd.DataFrame(entities_list)
-            entities_df.to_csv(output_dir / f"{base_name}_entities.csv", index=False)
-            print(f"  ✓ Zapisano {base_name}_entities.csv ({len(entities_df)} wierszy)")
-        
-        # Szczegółowe dane - Trip Updates
-        if any('trip_update' in e for e in gtfs['entities']):
-            tu_list = []
-            for entity in gtfs['entities']:
-                if 'trip_update' in entity:
-                    tu = entity['trip_update']
-                    for stu in tu['stop_time_updates']:
-                        tu_row = {
-                            'entity_id': entity['id'],
-                            'trip_id': tu['trip']['trip_id'] if tu['trip'] else None,
-                            'route_id': tu['trip']['route_id'] if tu['trip'] else None,
-                            'stop_id': stu['stop_id'],
-                            'stop_sequence': stu['stop_sequence'],
-                            'arrival_delay': stu['arrival']['delay'] if stu['arrival'] else None,
-                            'arrival_time': stu['arrival']['time'] if stu['arrival'] else None,
-                            'departure_delay': stu['departure']['delay'] if stu['departure'] else None,
-                            'departure_time': stu['departure']['time'] if stu['departure'] else None,
-                            'schedule_relationship': stu['schedule_relationship']
-                        }
-                        tu_list.append(tu_row)
-            
-            if tu_list:
-                tu_df = pd.DataFrame(tu_list)
-                tu_df.to_csv(output_dir / f"{base_name}_trip_updates.csv", index=False)
-                print(f"  ✓ Zapisano {base_name}_trip_updates.csv ({len(tu_df)} wierszy)")
-        
-        # Szczegółowe dane - Vehicle Positions
-        if any('vehicle_position' in e for e in gtfs['entities']):
-            vp_list = []
-            for entity in gtfs['entities']:
-                if 'vehicle_position' in entity:
-                    vp = entity['vehicle_position']
-                    vp_row = {
-                        'entity_id': entity['id'],
-                        'trip_id': vp['trip']['trip_id'] if vp['trip'] else None,
-                        'route_id': vp['trip']['route_id'] if vp['trip'] else None,
-                        'vehicle_id': vp['vehicle']['id'] if vp['vehicle'] else None,
-                        'latitude': vp['position']['latitude'] if vp['position'] else None,
-                        'longitude': vp['position']['longitude'] if vp['position'] else None,
-                        'speed': vp['position']['speed'] if vp['position'] else None,
-                        'bearing': vp['position']['bearing'] if vp['position'] else None,
-                        'current_stop_id': vp['stop_id'],
-                        'current_stop_sequence': vp['current_stop_sequence'],
-                        'current_status': vp['current_status'],
-                        'timestamp': vp['timestamp'],
-                        'congestion_level': vp['congestion_level'],
-                        'occupancy_status': vp['occupancy_status']
-                    }
-                    vp_list.append(vp_row)
-            
-            if vp_list:
-                vp_df = pd.DataFrame(vp_list)
-                vp_df.to_csv(output_dir / f"{base_name}_vehicle_positions.csv", index=False)
-                print(f"  ✓ Zapisano {base_name}_vehicle_positions.csv ({len(vp_df)} wierszy)")
-        
-        # Szczegółowe dane - Alerts
-        if any('alert' in e for e in gtfs['entities']):
-            alert_list = []
-            for entity in gtfs['entities']:
-                if 'alert' in entity:
-                    alert = entity['alert']
-                    for ie in alert['informed_entity']:
-                        alert_row = {
-                            'entity_id': entity['id'],
-                            'cause': alert['cause'],
-                            'effect': alert['effect'],
-                            'agency_id': ie['agency_id'],
-                            'route_id': ie['route_id'],
-                            'route_type': ie['route_type'],
-                            'trip_id': ie['trip']['trip_id'] if ie['trip'] else None,
-                            'stop_id': ie['stop_id']
-                        }
-                        alert_list.append(alert_row)
-            
-            if alert_list:
-                alert_df = pd.DataFrame(alert_list)
-                alert_df.to_csv(output_dir / f"{base_name}_alerts.csv", index=False)
-                print(f"  ✓ Zapisano {base_name}_alerts.csv ({len(alert_df)} wierszy)")
+        # Entities oraz szczegółowe tabele - kolumny zbudowane już przy parsowaniu
+        columns = gtfs['columns']
+        for table in ('entities', 'trip_updates', 'vehicle_positions', 'alerts'):
+            if columns[table]['entity_id']:
+                rows = write_columns_csv(columns[table], output_dir / f"{base_name}_{table}.csv")
+                print(f"  ✓ Zapisano {base_name}_{table}.csv ({rows} wierszy)")
     
     # 3. Pola protobuf (jeśli są i nie jest GTFS Realtime)
     if not analysis.get('is_gtfs_realtime') and 'protobuf_fields' in analysis and analysis['protobuf_fields']:
@@ -539,13 +713,37 @@ def save_to_csv(analysis: Dict, output_dir: Path):
         except Exception as e:
             print(f"  ⚠ Nie udało się zapisać JSON do CSV: {e}")
             # Zapisz jako tekst JSON
-            with open(output_dir / f"{base_name}_json.txt", 'w', encoding='utf-8') as f:
-                json.dump(analysis['json_data'], f, indent=2, ensure_ascii=False)
+            json_dump_text(analysis['json_data'], output_dir / f"{base_name}_json.txt")
             print(f"  ✓ Zapisano {base_name}_json.txt")
 
 
+def process_one(bin_file: Path, output_dir: Path) -> str:
+    """
+    Analizuje jeden plik .bin i zapisuje jego CSV (w osobnym procesie).
+    Zwraca wypisany przy tym log, żeby komunikaty plików się nie przeplatały
+    """
+    log = io.StringIO()
+    # Także stderr - traceback błędu trafia do logu tego pliku
+    with contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            analysis = analyze_binary_file(bin_file)
+            save_to_csv(analysis, output_dir)
+        except Exception as e:
+            print(f"\n✗ Błąd przy przetwarzaniu {bin_file.name}: {e}")
+            traceback.print_exc()
+    return log.getvalue()
+
+
 def main():
     """Główna funkcja"""
+    if not GTFS_REALTIME_AVAILABLE:
+        print("⚠ Biblioteka gtfs-realtime-bindings nie jest zainstalowana.")
+        print("  Uruchom: pip install gtfs-realtime-bindings")
+        print("  Skrypt będzie próbował parsować ręcznie.\n")
+    elif PROTOBUF_PURE_PYTHON:
+        print("⚠ protobuf działa w implementacji czysto pythonowej - parsowanie będzie wolne.")
+        print("  Uruchom: pip install \"protobuf>=4.21\" (zawiera backend upb)\n")
+    
     print("=" * 60)
     print("KONWERSJA PLIKÓW BINARNYCH DO CSV")
     print("=" * 60)
@@ -556,6 +754,8 @@ def main():
     output_dir.mkdir(exist_ok=True)
     
     print(f"\nFolder wyjściowy: {output_dir}")
+    if CSV_WRITER == "pyarrow" and not PYARROW_AVAILABLE:
+        print("⚠ BIN_TO_CSV_WRITER=pyarrow, ale pyarrow nie jest zainstalowany - zapis przez pandas")
     
     # Znajdź wszystkie pliki .bin
     bin_files = list(base_dir.glob("*.bin"))
@@ -568,15 +768,13 @@ def main():
     for f in bin_files:
         print(f"  - {f.name}")
     
-    # Analizuj każdy plik
-    for bin_file in bin_files:
-        try:
-            analysis = analyze_binary_file(bin_file)
-            save_to_csv(analysis, output_dir)
-        except Exception as e:
-            print(f"\n✗ Błąd przy przetwarzaniu {bin_file.name}: {e}")
-            import traceback
-            traceback.print_exc()
+    prefetch_files(bin_files)
+    
+    # Analizuj pliki równolegle - każdy jest niezależny, a parsowanie i zapis CSV
+    # trzymają GIL, więc używamy procesów zamiast wątków
+    with ProcessPoolExecutor(max_workers=min(len(bin_files), os.cpu_count() or 1)) as executor:
+        for log in executor.map(process_one, bin_files, repeat(output_dir)):
+            print(log, end='')
     
     print("\n" + "=" * 60)
     print("✓ Konwersja zakończona!")